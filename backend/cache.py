@@ -0,0 +1,336 @@
+"""
+This module holds a small, thread safe, size bounded LRU cache (with an optional TTL) and its hit/miss counters.
+FastAPI runs the sync endpoints in a threadpool, so every operation on the cache is guarded by a lock.
+A persistent variant keeps its entries in a JSON lines file too, so they survive restarts,
+and the file can be shared by the worker processes of the API.
+
+It also holds the cache of the per file results of the preprocessing, so only new or changed files are processed again.
+"""
+
+from collections import OrderedDict
+from contextlib import contextmanager
+from threading import Lock
+from typing import Any, Callable, Hashable, Iterable, Iterator
+import hashlib
+import json
+import os
+import pickle
+import time
+
+try:
+    import fcntl
+except (
+    ImportError
+):  # Windows, the persistent cache is only safe for a single process there
+    fcntl = None
+
+
+class LRUCache:
+    """
+    A size bounded least recently used cache, with an optional time to live for its entries.
+
+    Attributes:
+        maxsize (int): The maximum number of entries, the least recently used entry is evicted first.
+        ttl (float | None): The number of seconds an entry is valid for, None means forever.
+        hits (int): The number of lookups that found a valid entry.
+        misses (int): The number of lookups that did not find a valid entry.
+    """
+
+    def __init__(self, maxsize: int = 128, ttl: float | None = None):
+        self.maxsize = maxsize
+        self.ttl = ttl
+        self.hits = 0
+        self.misses = 0
+        self._entries: OrderedDict[Hashable, tuple[float, Any]] = OrderedDict()
+        self._lock = Lock()
+
+    def get(self, key: Hashable, default: Any = None) -> Any:
+        """
+        Get the value of a key and mark it as the most recently used one.
+
+        Args:
+            key (Hashable): The key to look up.
+            default (Any): The value to return when the key is missing or expired.
+
+        Returns:
+            Any: The cached value or the default.
+        """
+
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is None or (self.ttl is not None and entry[0] < time.monotonic()):
+                self._entries.pop(key, None)
+                self.misses += 1
+                return default
+
+            self._entries.move_to_end(key)
+            self.hits += 1
+            return entry[1]
+
+    def set(self, key: Hashable, value: Any) -> None:
+        """
+        Store a value, evicting the least recently used entries if the cache is full.
+
+        Args:
+            key (Hashable): The key of the value.
+            value (Any): The value to store.
+        """
+
+        expires = time.monotonic() + self.ttl if self.ttl is not None else 0
+        with self._lock:
+            self._entries[key] = (expires, value)
+            self._entries.move_to_end(key)
+            while len(self._entries) > self.maxsize:
+                self._entries.popitem(last=False)
+
+    def get_or_set(self, key: Hashable, factory: Callable[[], Any]) -> Any:
+        """
+        Get the value of a key, or compute it with the factory and store it when it's missing.
+        The factory runs outside the lock, so two threads may compute the same value at the same time.
+
+        Args:
+            key (Hashable): The key to look up.
+            factory (Callable[[], Any]): The function that computes the value.
+
+        Returns:
+            Any: The cached or the freshly computed value.
+        """
+
+        missing = object()
+        value = self.get(key, missing)
+        if value is missing:
+            value = factory()
+            self.set(key, value)
+
+        return value
+
+    def clear(self) -> None:
+        """
+        Remove all the entries of the cache, the counters are kept.
+        """
+
+        with self._lock:
+            self._entries.clear()
+
+    def stats(self) -> dict[str, int | float]:
+        """
+        Get the size and the hit/miss counters of the cache.
+
+        Returns:
+            dict[str, int | float]: The statistics of the cache.
+        """
+
+        with self._lock:
+            lookups = self.hits + self.misses
+            return {
+                "size": len(self._entries),
+                "maxsize": self.maxsize,
+                "hits": self.hits,
+                "misses": self.misses,
+                "hit_rate": self.hits / lookups if lookups else 0.0,
+            }
+
+
+class PersistentLRUCache(LRUCache):
+    """
+    An LRU cache whose entries are also appended to a JSON lines file and loaded back from it on creation.
+    The keys must be strings and the values JSON serializable. The file is compacted to the most recent entries
+    when it grows to twice the size of the cache.
+
+    Many processes may use the same file, every change of the file happens under an exclusive `flock` on a lock file
+    next to it (POSIX only). A process only sees the entries of the others when it's created.
+    Lines that can't be read (e.g. cut by a crash in the middle of an append) are skipped.
+
+    Attributes:
+        path (str): The path of the JSON lines file.
+    """
+
+    def __init__(self, path: str, maxsize: int = 128, ttl: float | None = None):
+        super().__init__(maxsize, ttl)
+        self.path = path
+        self._lines = 0
+
+        with self._file_lock():
+            entries, skipped = self._read_file()
+            for key, value in entries:
+                super().set(key, value)
+            self._lines = len(entries)
+
+            if skipped:
+                print(f"Skipped {skipped} unreadable lines of {path}")
+                self._compact(entries)
+
+    def set(self, key: str, value: Any) -> None:
+        super().set(key, value)
+        with self._lock, self._file_lock():
+            with open(self.path, "a", encoding="utf-8") as f:
+                f.write(json.dumps([key, value]) + "\n")
+
+            self._lines += 1
+            if self._lines > 2 * self.maxsize:
+                self._compact(self._read_file()[0])
+
+    def clear(self) -> None:
+        super().clear()
+        with self._lock, self._file_lock():
+            self._compact([])
+
+    @contextmanager
+    def _file_lock(self) -> Iterator[None]:
+        if fcntl is None:
+            yield
+            return
+
+        with open(self.path + ".lock", "a") as lock:
+            fcntl.flock(lock, fcntl.LOCK_EX)
+            try:
+                yield
+            finally:
+                fcntl.flock(lock, fcntl.LOCK_UN)
+
+    def _read_file(self) -> tuple[list[tuple[str, Any]], int]:
+        entries, skipped = [], 0
+        if not os.path.exists(self.path):
+            return entries, skipped
+
+        with open(self.path, "r", encoding="utf-8") as f:
+            for line in f:
+                try:
+                    key, value = json.loads(line)
+                except (ValueError, TypeError):
+                    skipped += 1
+                    continue
+                entries.append((key, value))
+
+        return entries, skipped
+
+    def _compact(self, entries: list[tuple[str, Any]]) -> None:
+        # The file may have entries of other processes, so it's compacted from its own entries, not the memory ones
+        latest = OrderedDict()
+        for key, value in entries:
+            latest[key] = value
+            latest.move_to_end(key)
+        while len(latest) > self.maxsize:
+            latest.popitem(last=False)
+
+        tmp_path = f"{self.path}.{os.getpid()}.tmp"
+        with open(tmp_path, "w", encoding="utf-8") as f:
+            for key, value in latest.items():
+                f.write(json.dumps([key, value]) + "\n")
+
+        os.replace(tmp_path, self.path)
+        self._lines = len(latest)
+
+
+class FileResultCache:
+    """
+    A cache of results computed from files, kept in a directory with a manifest that maps every file
+    (path, modification time and size) to the hash of its content, and every hash to a pickled result.
+    A file whose modification time and size didn't change is not read at all, a file that changed is hashed
+    and only computed again if its content changed.
+
+    Attributes:
+        directory (str): The directory of the manifest and the results.
+        version (str): The version of the code that computes the results, a different version discards the cache.
+        hits (int): The number of files whose result was reused.
+        misses (int): The number of files whose result was computed.
+    """
+
+    def __init__(self, directory: str, version: str):
+        self.directory = directory
+        self.version = version
+        self.hits = 0
+        self.misses = 0
+        self._files: dict[str, dict] = {}
+        self._seen: dict[str, dict] = {}
+
+        try:
+            with open(f"{directory}/manifest.json", "r") as f:
+                manifest = json.load(f)
+        except (OSError, ValueError):
+            manifest = {}
+
+        if manifest.get("version") == version:
+            self._files = manifest["files"]
+
+    def get_or_compute(
+        self, files: list[str], compute: Callable[[list[str]], Iterable[Any]]
+    ) -> list[Any]:
+        """
+        Get the results of the files, computing the results of the new and changed files only.
+
+        Args:
+            files (list[str]): The paths of the files.
+            compute (Callable[[list[str]], Iterable[Any]]): The function that computes the results
+                of a list of files, in the same order.
+
+        Returns:
+            list[Any]: The result of every file, in the order of the files.
+        """
+
+        results, entries, missing = {}, {}, []
+        for file in files:
+            stat = os.stat(file)
+            entry = {"mtime": stat.st_mtime_ns, "size": stat.st_size}
+            cached = self._files.get(file)
+            if (
+                cached is not None
+                and cached["mtime"] == entry["mtime"]
+                and cached["size"] == entry["size"]
+            ):
+                entry["hash"] = cached["hash"]
+            else:
+                entry["hash"] = _file_hash(file)
+
+            entries[file] = entry
+            try:
+                with open(self._result_path(entry["hash"]), "rb") as f:
+                    results[file] = pickle.load(f)
+                self.hits += 1
+            except Exception:
+                # Missing, truncated or stale (e.g. pickled from classes that changed) results are computed again
+                missing.append(file)
+
+        os.makedirs(self.directory, exist_ok=True)
+        for file, result in zip(missing, compute(missing)):
+            with open(self._result_path(entries[file]["hash"]), "wb") as f:
+                pickle.dump(result, f)
+            results[file] = result
+            self.misses += 1
+
+        self._seen.update(entries)
+        return [results[file] for file in files]
+
+    def save(self) -> None:
+        """
+        Write the manifest with the files used since the cache was created,
+        and delete the results that none of them needs anymore (including the results of other versions).
+        """
+
+        os.makedirs(self.directory, exist_ok=True)
+        with open(f"{self.directory}/manifest.json.tmp", "w") as f:
+            json.dump({"version": self.version, "files": self._seen}, f)
+        os.replace(
+            f"{self.directory}/manifest.json.tmp", f"{self.directory}/manifest.json"
+        )
+
+        needed = {
+            os.path.basename(self._result_path(entry["hash"]))
+            for entry in self._seen.values()
+        }
+        for name in os.listdir(self.directory):
+            if name.endswith(".pickle") and name not in needed:
+                os.remove(f"{self.directory}/{name}")
+
+    def _result_path(self, file_hash: str) -> str:
+        # The version is part of the name, so results of other versions are never reused (and get pruned)
+        return f"{self.directory}/{self.version}-{file_hash}.pickle"
+
+
+def _file_hash(path: str) -> str:
+    digest = hashlib.sha256()
+    with open(path, "rb") as f:
+        for chunk in iter(lambda: f.read(1 << 20), b""):
+            digest.update(chunk)
+
+    return digest.hexdigest()
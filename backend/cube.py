@@ -0,0 +1,265 @@
+"""
+This module holds the monthly aggregate cube that powers the range dependent parts of the `/report` endpoint.
+
+The cube is built once (at startup) from a preprocessed dataframe that has a `date` column in `%Y-%m` format,
+a `location` column and some numeric columns. It is a dense location x month x column array that keeps the
+cumulative sums and the cumulative counts of the non-null values, so the average of any column over any
+month range is just two lookups and a division, instead of filtering and grouping the dataframe again.
+"""
+
+from datetime import date
+
+import numpy as np
+import pandas as pd
+
+from . import helpers
+
+# The number of months in a period of every supported history resolution
+RESOLUTIONS = {"month": 1, "quarter": 3, "year": 12}
+
+
+def month_ordinal(value: date | pd.Timestamp) -> int:
+    """
+    Convert a date to the number of months since year 0, so months can be used as array offsets.
+
+    Args:
+        value (date | pd.Timestamp): The date to convert, the day is ignored.
+
+    Returns:
+        int: The month ordinal of the date.
+    """
+
+    return value.year * 12 + value.month - 1
+
+
+def month_window(from_date: date, to_date: date) -> tuple[int, int]:
+    """
+    Find the months whose first day is inside the (inclusive) date range.
+    Two date ranges with the same month window select exactly the same monthly rows.
+
+    Args:
+        from_date (date): The start of the range.
+        to_date (date): The end of the range.
+
+    Returns:
+        tuple[int, int]: The half open [start, stop) month ordinals of the range.
+    """
+
+    return month_ordinal(from_date) + (from_date.day > 1), month_ordinal(to_date) + 1
+
+
+class MonthlyCube:
+    """
+    Cumulative location x month x column aggregates of a monthly dataframe.
+
+    Attributes:
+        locations (np.ndarray): The sorted unique locations (first axis).
+        columns (list[str]): The aggregated columns (last axis).
+        first_month (int): The month ordinal of the first month (second axis).
+        months (int): The number of months covered by the cube.
+        sums (np.ndarray): Cumulative sums with shape (locations, months + 1, columns).
+        counts (np.ndarray): Cumulative non-null counts with shape (locations, months + 1, columns).
+        rows (np.ndarray): Cumulative row counts with shape (locations, months + 1).
+    """
+
+    def __init__(self, df: pd.DataFrame, columns: list[str]):
+        dates = pd.to_datetime(df["date"], format="%Y-%m")
+        ordinals = (dates.dt.year * 12 + dates.dt.month - 1).to_numpy()
+
+        self.columns = list(columns)
+        self.locations = np.unique(df["location"].to_numpy(dtype=object))
+        self.first_month = int(ordinals.min()) if len(ordinals) else 0
+        self.months = int(ordinals.max()) - self.first_month + 1 if len(ordinals) else 0
+
+        location_index = np.searchsorted(
+            self.locations, df["location"].to_numpy(dtype=object)
+        )
+        month_index = ordinals - self.first_month + 1
+        values = df[self.columns].to_numpy(dtype=float)
+
+        shape = (len(self.locations), self.months + 1, len(self.columns))
+        self.sums = np.zeros(shape)
+        self.counts = np.zeros(shape, dtype=np.int64)
+        self.rows = np.zeros(shape[:2], dtype=np.int64)
+
+        # Scatter every row into its (location, month) bin, the first month slot is left empty on purpose
+        # so the cumulative arrays start with zeros and range totals don't need a special case.
+        np.add.at(self.sums, (location_index, month_index), np.nan_to_num(values))
+        np.add.at(self.counts, (location_index, month_index), ~np.isnan(values))
+        np.add.at(self.rows, (location_index, month_index), 1)
+
+        np.cumsum(self.sums, axis=1, out=self.sums)
+        np.cumsum(self.counts, axis=1, out=self.counts)
+        np.cumsum(self.rows, axis=1, out=self.rows)
+
+    def window(self, from_date: date, to_date: date) -> tuple[int, int]:
+        """
+        Find the months of the cube whose first day is inside the (inclusive) date range.
+
+        Args:
+            from_date (date): The start of the range.
+            to_date (date): The end of the range.
+
+        Returns:
+            tuple[int, int]: The half open [start, stop) month offsets of the range, clamped to the cube.
+        """
+
+        start, stop = month_window(from_date, to_date)
+        start, stop = start - self.first_month, stop - self.first_month
+        start = min(max(start, 0), self.months)
+        stop = min(max(stop, start), self.months)
+        return start, stop
+
+    def totals(
+        self, start: int | np.ndarray, stop: int | np.ndarray
+    ) -> tuple[np.ndarray, np.ndarray, np.ndarray]:
+        """
+        Get the sums, the non-null counts and the row counts of the months in [start, stop).
+        When arrays of offsets are given, the totals of every window are returned on the second axis.
+
+        Args:
+            start (int | np.ndarray): The first month offset(s) of the window(s).
+            stop (int | np.ndarray): The month offset(s) right after the window(s).
+
+        Returns:
+            tuple[np.ndarray, np.ndarray, np.ndarray]: The sums, the non-null counts and the row counts.
+        """
+
+        return (
+            self.sums[:, stop] - self.sums[:, start],
+            self.counts[:, stop] - self.counts[:, start],
+            self.rows[:, stop] - self.rows[:, start],
+        )
+
+    def means(self, from_date: date, to_date: date) -> tuple[np.ndarray, np.ndarray]:
+        """
+        Calculate the average of every column per location, for the months in the date range.
+        Locations with no rows in the range are left out, like a `groupby` on the filtered dataframe would do.
+
+        Args:
+            from_date (date): The start of the range.
+            to_date (date): The end of the range.
+
+        Returns:
+            tuple[np.ndarray, np.ndarray]: The locations and their averages (NaN when there is no value).
+        """
+
+        sums, counts, rows = self.totals(*self.window(from_date, to_date))
+        present = rows > 0
+        return self.locations[present], _divide(sums[present], counts[present])
+
+    def overall_means(self, from_date: date, to_date: date) -> np.ndarray | None:
+        """
+        Calculate the average of every column across all locations, for the months in the date range.
+
+        Args:
+            from_date (date): The start of the range.
+            to_date (date): The end of the range.
+
+        Returns:
+            np.ndarray | None: The averages (NaN when there is no value) or None if there are no rows in the range.
+        """
+
+        sums, counts, rows = self.totals(*self.window(from_date, to_date))
+        if rows.sum() == 0:
+            return None
+
+        return _divide(sums.sum(axis=0), counts.sum(axis=0))
+
+    def periods(
+        self, from_date: date, to_date: date, months_per_period: int = 1
+    ) -> tuple[np.ndarray, np.ndarray, np.ndarray, np.ndarray]:
+        """
+        Split the month window of the date range at period boundaries (e.g. quarters or years)
+        and get the totals of every piece, the same way `totals` does for a single window.
+
+        Args:
+            from_date (date): The start of the range.
+            to_date (date): The end of the range.
+            months_per_period (int): The length of a period in months, it must divide 12.
+
+        Returns:
+            tuple[np.ndarray, np.ndarray, np.ndarray, np.ndarray]: The first month ordinal of every period,
+            the sums, the non-null counts and the row counts with periods on the second axis.
+        """
+
+        start, stop = self.window(from_date, to_date)
+        months = np.arange(start, stop) + self.first_month
+        periods = np.unique(months - months % months_per_period)
+        starts = np.maximum(periods - self.first_month, start)
+        stops = np.minimum(periods + months_per_period - self.first_month, stop)
+        return (periods, *self.totals(starts, stops))
+
+    def yearly_means(
+        self, from_date: date, to_date: date
+    ) -> tuple[np.ndarray, np.ndarray]:
+        """
+        Calculate the average of every column across all locations per year, for the months in the date range.
+        Years with no rows in the range are left out.
+
+        Args:
+            from_date (date): The start of the range.
+            to_date (date): The end of the range.
+
+        Returns:
+            tuple[np.ndarray, np.ndarray]: The years and their averages with shape (years, columns).
+        """
+
+        years, sums, counts, rows = self.periods(from_date, to_date, 12)
+        present = rows.sum(axis=0) > 0
+        return (
+            years[present] // 12,
+            _divide(sums.sum(axis=0), counts.sum(axis=0))[present],
+        )
+
+    def history(
+        self, from_date: date, to_date: date, column: str, resolution: str = "month"
+    ) -> tuple[list[str], np.ndarray, np.ndarray]:
+        """
+        Build the location x period matrix of a column for the date range, with NaN where there is no value.
+
+        The periods are the ones the location with the most rows has data for,
+        every location with at least one row in the range gets a line.
+
+        Args:
+            from_date (date): The start of the range.
+            to_date (date): The end of the range.
+            column (str): The column to build the history of.
+            resolution (str): The length of a period, one of `RESOLUTIONS`.
+
+        Returns:
+            tuple[list[str], np.ndarray, np.ndarray]: The period labels, the locations
+            and the averages with shape (locations, periods).
+        """
+
+        periods, sums, counts, rows = self.periods(
+            from_date, to_date, RESOLUTIONS[resolution]
+        )
+        present = rows.sum(axis=1) > 0
+        if not present.any():
+            return [], self.locations[present], np.empty((0, 0))
+
+        # The location with the most periods decides the labels (the first one on ties)
+        main_location = np.argmax((rows > 0).sum(axis=1))
+        labeled = rows[main_location] > 0
+
+        column_index = self.columns.index(column)
+        values = _divide(
+            sums[present][:, labeled, column_index],
+            counts[present][:, labeled, column_index],
+        )
+        return (
+            [_period_label(period, resolution) for period in periods[labeled]],
+            self.locations[present],
+            values,
+        )
+
+
+def _period_label(period: int, resolution: str) -> str:
+    year, month = divmod(int(period), 12)
+    return helpers.period_label(date(year, month + 1, 1), resolution)
+
+
+def _divide(sums: np.ndarray, counts: np.ndarray) -> np.ndarray:
+    with np.errstate(invalid="ignore", divide="ignore"):
+        return np.where(counts > 0, sums / np.maximum(counts, 1), np.nan)
@@ -9,20 +9,170 @@ For example:
 cd .. && python -m backend.data && cd backend
 ```
 
+Next to the TSV files, a binary columnar copy of the data is kept in `data/columnar` (NumPy `.npy` files and a manifest),
+so the API can memory-map it on startup instead of parsing the TSV files (and the JSON polygons in them).
+The location polygons are kept in it as the `/locations` bodies of every level of detail (the lower ones simplified),
+already encoded and compressed, so every process memory-maps the same bytes and serves them as they are.
+State derived from the data that is expensive to build can also be kept next to a copy with `generation_file`,
+so it's built by the first process that needs it and shared by the rest.
+It's written by `preprocess_data` and by `load_data` when it's missing or stale, or manually with:
+```bash
+cd .. && python -m backend.data columnar && cd backend
+```
+Every write of the columnar copy gets the next `generation` number, so processes can tell that a newer copy exists.
+When many API worker processes run on the same machine, the copy can be written once (by the command above, before
+the workers start) and the workers can only attach to it with `load_data(shared=True)`, without reading the TSV files.
+
 To download the original data, visit the [Github Releases](https://github.com/KonstantinosPetrakis/airwave-thess/releases/tag/original-data).
 """
 
+from concurrent.futures import ProcessPoolExecutor
+from contextlib import contextmanager, suppress
+from contextvars import ContextVar
+from typing import Callable, Iterator
+import hashlib
 import json
+import mmap
 import os
+import shutil
+import sys
+import tempfile
+import time
 
 from thefuzz import fuzz
 import pandas as pd
 import numpy as np
 
-from .schemas import LocationName
-
+from .cache import FileResultCache
+from . import serialization
+from .geometry import simplify_multi_polygons
+from .schemas import LocationDetail, LocationName
 
 DATA_DIR = os.path.dirname(os.path.abspath(__file__)) + "/data"
+COLUMNAR_DIR = f"{DATA_DIR}/columnar"
+PREPROCESS_CACHE_DIR = f"{DATA_DIR}/.preprocess"
+PARAMETER_MATCHES_PATH = f"{PREPROCESS_CACHE_DIR}/parameter_matches.json"
+# Bump them when the processing of the raw files changes, so their cached results are not used anymore
+AIR_QUALITY_CACHE_VERSION = "3"
+SEA_WATER_QUALITY_CACHE_VERSION = "1"
+# Bump it when the tables derived from the TSV files change, so stale columnar copies are written again
+COLUMNAR_VERSION = "4"
+MANIFEST_PATH = f"{COLUMNAR_DIR}/manifest.json"
+TABLES = ["location", "air_quality", "sea_water_quality"]
+# Tables that are only loaded when their TSV file exists, the daily rollups need the original data to be preprocessed
+OPTIONAL_TABLES = ["air_quality_daily"]
+
+# The simplification tolerance (in degrees) of every level of detail of the location polygons but the full one
+LOCATION_DETAIL_TOLERANCES = {"low": 1e-3, "medium": 2e-4}
+# The file extension of the `/locations` body of every content coding, in the order of preference
+LOCATION_BODY_EXTENSIONS = {"br": "json.br", "gzip": "json.gz", "identity": "json"}
+
+# The statistics every rollup of the time series keeps per period
+ROLLUP_STATISTICS = ["sum", "count", "min", "max"]
+
+# The pollutants of the air quality files and the number of rows the files are read in at a time
+AIR_QUALITY_POLLUTANTS = ["co", "no", "no2", "so2", "o3"]
+CSV_CHUNK_ROWS = 100_000
+
+# The canonical names of the sea water quality parameters (with their units) and how close (0-100)
+# the name of a parameter in the workbooks must be to one of them to get its canonical name
+SEA_WATER_QUALITY_PARAMETERS = {
+    "Θερμοκρασία": "temperature",
+    "Θερμοκρασία κατά την λήψη του δείγματος": "temperature",
+    "Διαλυμένο Οξυγόνο (mg/l)": "dissolved_oxygen",
+    "Ποσοστό κορεσμού διαλυμένου οξυγόνου (% DO)": "dissolved_oxygen_percentage",
+    "Διαλυμένο Οξυγόνο (%)": "dissolved_oxygen_percentage",
+    "Αρσενικό (mg/l)": "arsenic",
+    "Μόλυβδος (mg/l)": "lead",
+    "Κάδμιο (mg/l)": "cadmium",
+    "Νικέλιο (mg/l)": "nickel",
+    "Χαλκός (mg/l)": "copper",
+}
+PARAMETER_MATCH_THRESHOLD = 75
+
+# The levels of each pollutant (µg/m³) the air quality index is interpolated between
+AIR_QUALITY_INDEX_LEVELS = {
+    "o3": [0, 50, 100, 130, 240, 380, 800],
+    "no2": [0, 40, 90, 120, 210, 400, 600],
+    "so2": [0, 100, 200, 350, 500, 750, 1000],
+    "co": [0, 4400, 9400],
+}
+
+# The weight of each parameter in the water quality index and the threshold its score is calculated from
+SEA_WATER_QUALITY_INDEX_WEIGHTS = {
+    "arsenic": 0.15,
+    "cadmium": 0.15,
+    "copper": 0.1,
+    "dissolved_oxygen_percentage": 0.25,
+    "lead": 0.1,
+    "nickel": 0.1,
+    "temperature": 0.15,
+}
+SEA_WATER_QUALITY_INDEX_THRESHOLDS = {
+    "arsenic": 0.012,
+    "cadmium": 0.0055,
+    "copper": 0.0013,
+    "lead": 0.0044,
+    "nickel": 0.07,
+    "dissolved_oxygen_percentage": 100,
+    "temperature": 20,
+}
+
+_load_hooks: list[Callable[[dict], None]] = []
+_current_data: dict | None = None
+_pinned_data: ContextVar[dict | None] = ContextVar("pinned_data", default=None)
+
+
+def on_load(hook: Callable[[dict], None]) -> Callable[[dict], None]:
+    """
+    Register a function that is called with the freshly loaded data every time `load_data` runs.
+    It's meant for state that is derived from the data, so it gets rebuilt (invalidated) on every reload.
+    The hook can store the derived state in the data dictionary, so it's swapped in (and out) together with the data.
+
+    Args:
+        hook (Callable[[dict], None]): The function to call with the loaded data.
+
+    Returns:
+        Callable[[dict], None]: The same function, so it can be used as a decorator.
+    """
+
+    _load_hooks.append(hook)
+    return hook
+
+
+def get_data() -> dict:
+    """
+    Get the snapshot of the data that the current request should use: the one pinned with `use_data`
+    in the current context, or else the one built by the last `load_data` call.
+    A request should get the snapshot once and use it for all its work, so a reload in the meantime
+    doesn't mix old and new data in a single response.
+
+    Returns:
+        dict: The loaded data, with the state derived from them by the `on_load` hooks.
+    """
+
+    data = _pinned_data.get() or _current_data
+    if data is None:
+        raise RuntimeError("The data have not been loaded yet, call `load_data` first.")
+
+    return data
+
+
+@contextmanager
+def use_data(data: dict) -> Iterator[None]:
+    """
+    Make `get_data` return a specific snapshot inside the block (in the same context),
+    e.g. to let the tool calls of a long running request use the snapshot the request started with.
+
+    Args:
+        data (dict): The snapshot returned by `get_data` or `load_data`.
+    """
+
+    token = _pinned_data.set(data)
+    try:
+        yield
+    finally:
+        _pinned_data.reset(token)
 
 
 def _preprocess_location_data() -> pd.DataFrame:
@@ -75,35 +225,150 @@ def _preprocess_location_data() -> pd.DataFrame:
     return location_df
 
 
-def _calculate_air_quality_index(row: pd.Series) -> float:
-    levels = {
-        "o3": [0, 50, 100, 130, 240, 380, 800],
-        "no2": [0, 40, 90, 120, 210, 400, 600],
-        "so2": [0, 100, 200, 350, 500, 750, 1000],
-        "co": [0, 4400, 9400],
-    }
+def calculate_air_quality_index(df: pd.DataFrame) -> pd.Series:
+    """
+    Calculate the air quality index of every row of a dataframe, at any resolution (e.g. monthly means or hourly measurements).
+    The index of each pollutant is interpolated linearly between its levels (the first level is 1, the second 2, etc.)
+    and the index of the row is the worst (highest) one of its pollutants.
+
+    Pollutants that are not columns of the dataframe are skipped, and so are missing (NaN) values,
+    a row without any pollutant value gets a NaN index. Values outside the levels are clipped to the first/last level.
+
+    Args:
+        df (pd.DataFrame): The data, with (some of) the pollutant columns of `AIR_QUALITY_INDEX_LEVELS` in µg/m³.
+
+    Returns:
+        pd.Series: The air quality index of every row.
+    """
 
     indicators = []
-    for key in levels.keys():
-        if key not in row:
+    for key, levels in AIR_QUALITY_INDEX_LEVELS.items():
+        if key not in df.columns:
+            continue
+
+        levels = np.array(levels, dtype=float)
+        values = np.clip(df[key].to_numpy(dtype=float), levels[0], levels[-1])
+        # The position of the highest level that is lower than (or equal to) each value
+        low = np.searchsorted(levels, values, side="right") - 1
+        low = np.clip(low, 0, len(levels) - 2)
+
+        indicators.append(
+            low + 1 + (values - levels[low]) / (levels[low + 1] - levels[low])
+        )
+
+    # `fmax` skips NaN, unless all the values are NaN
+    index = np.fmax.reduce(indicators) if indicators else np.nan
+    return pd.Series(index, index=df.index, dtype=float)
+
+
+def _read_air_quality_file(file: str) -> tuple[pd.DataFrame, pd.DataFrame, float]:
+    # Runs in the worker processes of `_read_air_quality_files`
+    started_at = time.perf_counter()
+
+    # Some files have '_conc suffix' in the column names, both variants are read as floats
+    dtypes = {"time": str}
+    for pollutant in AIR_QUALITY_POLLUTANTS:
+        dtypes[pollutant] = dtypes[f"{pollutant}_conc"] = float
+
+    # The file is streamed in chunks of rows, only the monthly sums and counts (and the daily rollups) are kept,
+    # so the memory doesn't depend on the size of the file.
+    chunks = pd.read_csv(
+        file, usecols=lambda col: col in dtypes, dtype=dtypes, chunksize=CSV_CHUNK_ROWS
+    )
+    sums, counts, days, carry = [], [], [], None
+
+    def add_months(df: pd.DataFrame) -> None:
+        grouped = df.groupby("date")[AIR_QUALITY_POLLUTANTS]
+        sums.append(grouped.sum())
+        counts.append(grouped.count())
+        days.append(
+            df.groupby(df["time"].dt.to_period("D"))[AIR_QUALITY_POLLUTANTS].agg(
+                ROLLUP_STATISTICS
+            )
+        )
+
+    for chunk in chunks:
+        if chunk.empty:
             continue
 
-        value = row[key]
-        level_high = next((x for x in levels[key] if x >= value), None)
-        level_low = next((x for x in reversed(levels[key]) if x <= value), None)
-        index_low = levels[key].index(level_low) + 1
-        index_high = levels[key].index(level_high) + 1
+        chunk = chunk.rename(columns=lambda col: col.removesuffix("_conc"))
+        chunk["time"] = pd.to_datetime(chunk["time"])
+        chunk["date"] = chunk["time"].dt.to_period("M")
+        if carry is not None:
+            chunk = pd.concat([carry, chunk], ignore_index=True)
+
+        # The last month of the chunk may go on in the next chunk, its rows are carried over to it.
+        # So the rows of a month (when the file is sorted by time) are summed at once, like a whole file read would.
+        is_last_month = chunk["date"] == chunk["date"].iloc[-1]
+        carry = chunk[is_last_month]
+        add_months(chunk[~is_last_month])
 
-        indicator = index_low + (index_high - index_low) * (value - level_low) / (
-            level_high - level_low
+    if carry is not None:
+        add_months(carry)
+
+    if not sums:
+        # Nothing was read (e.g. the file only has a header), the results are empty but have the usual columns
+        add_months(
+            pd.DataFrame(
+                {
+                    "time": pd.Series(dtype="datetime64[ns]"),
+                    "date": pd.Series(dtype="period[M]"),
+                    **{
+                        pollutant: pd.Series(dtype=float)
+                        for pollutant in AIR_QUALITY_POLLUTANTS
+                    },
+                }
+            )
         )
 
-        indicators.append(indicator)
+    # Calculate the mean of each month, a month that shows up in many chunks (in an unsorted file) is summed up
+    sums = pd.concat(sums).groupby(level="date").sum()
+    counts = pd.concat(counts).groupby(level="date").sum()
+    df_grouped = (sums / counts).reset_index()
 
-    return max(indicators)
+    df_grouped["year"] = df_grouped["date"].dt.year
+
+    # The daily sum, count, minimum and maximum of every pollutant, for the finer resolutions of the time series
+    days = pd.concat(days)
+    daily = days.groupby(level=0).agg(
+        {
+            column: "sum" if column[1] in ("sum", "count") else column[1]
+            for column in days.columns
+        }
+    )
+    daily.columns = [
+        f"{pollutant}_{statistic}" for pollutant, statistic in daily.columns
+    ]
+    daily = daily.reset_index(names="date")
+
+    return df_grouped, daily, time.perf_counter() - started_at
+
+
+def _read_air_quality_files(
+    files: list[str],
+) -> list[tuple[pd.DataFrame, pd.DataFrame]]:
+    if not files:
+        return []
+
+    # The files are parsed and grouped by month in parallel, the results come back in the order of the files
+    with ProcessPoolExecutor() as executor:
+        results = executor.map(
+            _read_air_quality_file,
+            files,
+            chunksize=max(1, len(files) // (4 * (os.cpu_count() or 1))),
+        )
 
+        grouped_dfs = []
+        for file, (df_grouped, daily_df, seconds) in zip(files, results):
+            print(f"Read {file} in {seconds:.2f}s")
+            grouped_dfs.append((df_grouped, daily_df))
 
-def _preprocess_air_quality_data(location_df: pd.DataFrame) -> pd.DataFrame:
+    return grouped_dfs
+
+
+def _preprocess_air_quality_data(
+    location_df: pd.DataFrame, cache: FileResultCache
+) -> pd.DataFrame:
     air_quality_dir = f"{DATA_DIR}/Air Quality"
     air_quality_files = {
         d: [
@@ -113,152 +378,209 @@ def _preprocess_air_quality_data(location_df: pd.DataFrame) -> pd.DataFrame:
         for d in os.listdir(air_quality_dir)
     }
 
-    merged_df = pd.DataFrame()
-    for location, files in air_quality_files.items():
-        for file in files:
-            df = pd.read_csv(file)
-
-            # Some files have '_conc suffix' in the column names, make them consistent
-            if "co_conc" in df.columns:
-                df.rename(columns={"co_conc": "co"}, inplace=True)
-                df.rename(columns={"no_conc": "no"}, inplace=True)
-                df.rename(columns={"no2_conc": "no2"}, inplace=True)
-                df.rename(columns={"so2_conc": "so2"}, inplace=True)
-                df.rename(columns={"o3_conc": "o3"}, inplace=True)
-
-            # Group by month, and calculate the mean of each month
-            df["date"] = pd.to_datetime(df["time"]).dt.to_period("M")
-            df_grouped = (
-                df.groupby("date")[["co", "no", "no2", "so2", "o3"]]
-                .mean()
-                .reset_index()
-            )
+    # Find the closet location of each directory using fuzzy matching, all the files of a directory share it
+    location_names = [
+        name for name in location_df["name"] if name != LocationName.THERMAIKOS_PORT
+    ]
+    closest_locations = {
+        location: max(
+            location_names, key=lambda loc: fuzz.ratio(location.lower(), loc.lower())
+        )
+        for location in air_quality_files
+    }
 
-            df_grouped["year"] = df_grouped["date"].dt.year
+    # Only the new and changed files are read, the monthly means of the rest come from the cache
+    files = [
+        (location, file)
+        for location, location_files in air_quality_files.items()
+        for file in location_files
+    ]
+    started_at, misses = time.perf_counter(), cache.misses
+    results = cache.get_or_compute([file for _, file in files], _read_air_quality_files)
+    print(
+        f"Read {cache.misses - misses} of {len(files)} air quality files "
+        f"in {time.perf_counter() - started_at:.2f}s"
+    )
 
-            # Find the closet location using fuzzy matching
-            closest_location = max(
-                filter(
-                    lambda location: location != LocationName.THERMAIKOS_PORT,
-                    location_df["name"],
-                ),
-                key=lambda loc: fuzz.ratio(location.lower(), loc.lower()),
-            )
-            df_grouped["location"] = closest_location
+    for (location, _), (df_grouped, daily_df) in zip(files, results):
+        df_grouped["location"] = closest_locations[location]
+        daily_df["location"] = closest_locations[location]
 
-            merged_df = pd.concat([merged_df, df_grouped], ignore_index=True)
+    merged_df = pd.concat([df_grouped for df_grouped, _ in results], ignore_index=True)
+    daily_df = pd.concat([daily_df for _, daily_df in results], ignore_index=True)
 
-    # Calculate the air quality index
-    merged_df["air_quality_index"] = merged_df.apply(
-        _calculate_air_quality_index, axis=1
+    # The index of every day is calculated from the daily means, like the monthly index from the monthly means,
+    # and every day counts as one value of the index in the rollups of the coarser resolutions
+    daily_index = calculate_air_quality_index(
+        pd.DataFrame(
+            {
+                pollutant: daily_df[f"{pollutant}_sum"] / daily_df[f"{pollutant}_count"]
+                for pollutant in AIR_QUALITY_POLLUTANTS
+            }
+        )
     )
+    daily_df["air_quality_index_sum"] = daily_index.fillna(0)
+    daily_df["air_quality_index_count"] = daily_index.notna().astype(int)
+    daily_df["air_quality_index_min"] = daily_index
+    daily_df["air_quality_index_max"] = daily_index
+    daily_df.to_csv(f"{DATA_DIR}/air_quality_daily.tsv", index=False, sep="\t")
+
+    # Calculate the air quality index
+    merged_df["air_quality_index"] = calculate_air_quality_index(merged_df)
     merged_df.to_csv(f"{DATA_DIR}/air_quality.tsv", index=False, sep="\t")
     return merged_df
 
 
-def _calculate_sea_water_quality_index(row: pd.Series) -> float:
-    weights = {
-        "arsenic": 0.15,
-        "cadmium": 0.15,
-        "copper": 0.1,
-        "dissolved_oxygen_percentage": 0.25,
-        "lead": 0.1,
-        "nickel": 0.1,
-        "temperature": 0.15,
-    }
+def calculate_sea_water_quality_index(df: pd.DataFrame) -> pd.Series:
+    """
+    Calculate the water quality index of every row of a dataframe, at any resolution (e.g. yearly means or single samples).
+    Every parameter gets a score from its threshold and the index of the row is the weighted sum of the scores:
+    - temperature: 100 at the threshold, dropping linearly to 0 at 10 degrees away from it
+    - dissolved oxygen percentage: the percentage itself, up to the threshold
+    - everything else: 100 at 0, dropping linearly to 0 at the threshold
 
-    threshold_concentration = {
-        "arsenic": 0.012,
-        "cadmium": 0.0055,
-        "copper": 0.0013,
-        "lead": 0.0044,
-        "nickel": 0.07,
-        "dissolved_oxygen_percentage": 100,
-        "temperature": 20,
-    }
+    Parameters that are not columns of the dataframe are skipped, and so are missing (NaN) values,
+    so they just don't add to the index.
+
+    Args:
+        df (pd.DataFrame): The data, with (some of) the parameter columns of `SEA_WATER_QUALITY_INDEX_WEIGHTS`.
 
-    quality_index = 0
-    for parameter, value in row.items():
-        if (
-            parameter not in weights
-            or parameter not in threshold_concentration
-            or pd.isna(value)
-        ):
+    Returns:
+        pd.Series: The water quality index of every row.
+    """
+
+    quality_index = np.zeros(len(df))
+    # The scores are added in the order of the columns, like a sum over each row would
+    for parameter in df.columns:
+        if parameter not in SEA_WATER_QUALITY_INDEX_WEIGHTS:
             continue
 
-        weight = weights[parameter]
-        threshold = threshold_concentration[parameter]
+        values = df[parameter].to_numpy(dtype=float)
+        weight = SEA_WATER_QUALITY_INDEX_WEIGHTS[parameter]
+        threshold = SEA_WATER_QUALITY_INDEX_THRESHOLDS[parameter]
 
         if parameter == "temperature":
-            score = max(0, 100 * (1 - abs(value - threshold) / 10))
+            score = np.maximum(0, 100 * (1 - np.abs(values - threshold) / 10))
         elif parameter == "dissolved_oxygen_percentage":
-            score = min(value, threshold)
+            score = np.minimum(values, threshold)
         else:
-            score = max(0, 100 * (1 - value / threshold))
+            score = np.maximum(0, 100 * (1 - values / threshold))
+
+        quality_index += np.where(np.isnan(values), 0, weight * score)
 
-        quality_index += weight * score
+    return pd.Series(quality_index, index=df.index)
 
-    return quality_index
 
+def _convert_sea_water_quality_file(file: str) -> pd.DataFrame:
+    # Runs in the worker processes of `_convert_sea_water_quality_files`
+    # Read Excel, and Concatenate all sheets into a single dataframe
+    df = pd.concat(
+        pd.read_excel(
+            file, sheet_name=None, usecols=["Parameter", "Result", "Unit"]
+        ).values(),
+        ignore_index=True,
+    )
 
-def _preprocess_sea_water_quality_data() -> pd.DataFrame:
+    # Make the units consistent
+    # Parse the first float number from the 'Result' column
+    df["Result"] = (
+        df["Result"].astype(str).str.extract(r"([-+]?\d*\.\d+|\d+)").astype(float)
+    )
+
+    # If unit is μg/l, convert to mg/l
+    df.loc[df["Unit"] == "μg/L", "Result"] = (
+        df.loc[df["Unit"] == "μg/L", "Result"] / 1000
+    )
+    df.loc[df["Unit"] == "μg/l", "Unit"] = "mg/l"
+    return df
+
+
+def _convert_sea_water_quality_files(files: list[str]) -> list[pd.DataFrame]:
+    if not files:
+        return []
+
+    # Parsing Excel is slow, so the workbooks are parsed in parallel
+    with ProcessPoolExecutor() as executor:
+        return list(executor.map(_convert_sea_water_quality_file, files))
+
+
+def _load_parameter_matches() -> dict[str, str | None]:
+    try:
+        with open(PARAMETER_MATCHES_PATH, "r", encoding="utf-8") as f:
+            memo = json.load(f)
+    except (OSError, ValueError):
+        return {}
+
+    # The matches of other parameter names or another threshold are stale
+    return (
+        memo["matches"] if memo.get("version") == _parameter_matches_version() else {}
+    )
+
+
+def _save_parameter_matches(matches: dict[str, str | None]) -> None:
+    os.makedirs(PREPROCESS_CACHE_DIR, exist_ok=True)
+    with open(PARAMETER_MATCHES_PATH, "w", encoding="utf-8") as f:
+        memo = {"version": _parameter_matches_version(), "matches": matches}
+        json.dump(memo, f, ensure_ascii=False, indent=2)
+
+
+def _parameter_matches_version() -> str:
+    config = [SEA_WATER_QUALITY_PARAMETERS, PARAMETER_MATCH_THRESHOLD]
+    return hashlib.sha256(json.dumps(config).encode()).hexdigest()[:16]
+
+
+def _match_parameters(
+    parameters: pd.Series, matches: dict[str, str | None]
+) -> pd.Series:
+    # The closest name of `SEA_WATER_QUALITY_PARAMETERS` is memoized per (lowercase) parameter name,
+    # a parameter without a close enough name is kept as it is.
+    names = parameters.str.lower()
+    for name in names.dropna().unique():
+        if name in matches:
+            continue
+
+        closest_match = max(
+            SEA_WATER_QUALITY_PARAMETERS.keys(),
+            key=lambda col: fuzz.ratio(name, col.lower()),
+        )
+        closest_ratio = fuzz.ratio(name, closest_match.lower())
+        matches[name] = (
+            SEA_WATER_QUALITY_PARAMETERS[closest_match]
+            if closest_ratio >= PARAMETER_MATCH_THRESHOLD
+            else None
+        )
+
+    return names.map(matches).fillna(parameters)
+
+
+def _preprocess_sea_water_quality_data(cache: FileResultCache) -> pd.DataFrame:
     files = {
         int(f.split("_")[1]): os.path.join(f"{DATA_DIR}/Sea Water Quality", f)
         for f in os.listdir(f"{DATA_DIR}/Sea Water Quality")
     }
-    columns = {
-        "Θερμοκρασία": "temperature",
-        "Θερμοκρασία κατά την λήψη του δείγματος": "temperature",
-        "Διαλυμένο Οξυγόνο (mg/l)": "dissolved_oxygen",
-        "Ποσοστό κορεσμού διαλυμένου οξυγόνου (% DO)": "dissolved_oxygen_percentage",
-        "Διαλυμένο Οξυγόνο (%)": "dissolved_oxygen_percentage",
-        "Αρσενικό (mg/l)": "arsenic",
-        "Μόλυβδος (mg/l)": "lead",
-        "Κάδμιο (mg/l)": "cadmium",
-        "Νικέλιο (mg/l)": "nickel",
-        "Χαλκός (mg/l)": "copper",
-    }
-    ratio_threshold = 75
-
-    merged_df = pd.DataFrame()
-    for year, file in files.items():
-        # Read Excel, and Concatenate all sheets into a single dataframe
-        df = pd.concat(
-            pd.read_excel(
-                file, sheet_name=None, usecols=["Parameter", "Result", "Unit"]
-            ).values(),
-            ignore_index=True,
-        )
-
-        # Make the units consistent
-        # Parse the first float number from the 'Result' column
-        df["Result"] = (
-            df["Result"].astype(str).str.extract(r"([-+]?\d*\.\d+|\d+)").astype(float)
-        )
 
-        # If unit is μg/l, convert to mg/l
-        df.loc[df["Unit"] == "μg/L", "Result"] = (
-            df.loc[df["Unit"] == "μg/L", "Result"] / 1000
-        )
-        df.loc[df["Unit"] == "μg/l", "Unit"] = "mg/l"
+    # Only the new and changed workbooks are parsed, the rows of the rest come from the cache
+    started_at, misses = time.perf_counter(), cache.misses
+    converted_dfs = cache.get_or_compute(
+        list(files.values()), _convert_sea_water_quality_files
+    )
+    print(
+        f"Read {cache.misses - misses} of {len(files)} sea water quality files "
+        f"in {time.perf_counter() - started_at:.2f}s"
+    )
 
+    matches = _load_parameter_matches()
+    pivot_dfs = []
+    for year, df in zip(files, converted_dfs):
         df["Parameter"] = df["Parameter"] + df["Unit"].replace(np.nan, "")
         df.drop(columns=["Unit"], inplace=True)
 
         # Make the parameters consistent
-        for par in df["Parameter"].unique():
-            closest_match = max(
-                columns.keys(), key=lambda col: fuzz.ratio(par.lower(), col.lower())
-            )
-            closest_ratio = fuzz.ratio(par.lower(), closest_match.lower())
-
-            if closest_ratio >= ratio_threshold:
-                df.loc[df["Parameter"].str.lower() == par.lower(), "Parameter"] = (
-                    columns[closest_match]
-                )
+        df["Parameter"] = _match_parameters(df["Parameter"], matches)
 
         # Filter columns parameters not in the list
-        df = df[df["Parameter"].isin(columns.values())].reset_index(drop=True)
+        df = df[df["Parameter"].isin(SEA_WATER_QUALITY_PARAMETERS.values())]
+        df = df.reset_index(drop=True)
 
         # Group by parameter and take mean of each parameter
         df = df.groupby("Parameter").agg({"Result": "mean"}).reset_index()
@@ -266,16 +588,16 @@ def _preprocess_sea_water_quality_data() -> pd.DataFrame:
         df_pivot = df.pivot(
             index="year", columns="Parameter", values="Result"
         ).reset_index()
+        pivot_dfs.append(df_pivot)
 
-        merged_df = pd.concat([merged_df, df_pivot], ignore_index=True)
+    _save_parameter_matches(matches)
+    merged_df = pd.concat(pivot_dfs, ignore_index=True)
 
     # Add the location column
     merged_df["location"] = LocationName.THERMAIKOS_PORT
 
     # Calculate the quality index
-    merged_df["water_quality_index"] = merged_df.apply(
-        _calculate_sea_water_quality_index, axis=1
-    )
+    merged_df["water_quality_index"] = calculate_sea_water_quality_index(merged_df)
 
     # Fake monthly data
     months = [f"{month:02}" for month in range(1, 13)]
@@ -291,34 +613,354 @@ def _preprocess_sea_water_quality_data() -> pd.DataFrame:
 def preprocess_data():
     """
     This function preprocesses the original data and saves some new TSV files into the data directory.
+    Only the raw files that are new or have changed since the last run are processed again.
     The original data can be found in [Github Releases](https://github.com/KonstantinosPetrakis/airwave-thess/releases/tag/original-data).
     """
 
+    # The per file results of the raw files are cached, so a run after a new data drop only processes the new files
+    air_quality_cache = FileResultCache(
+        f"{PREPROCESS_CACHE_DIR}/air_quality", AIR_QUALITY_CACHE_VERSION
+    )
+    sea_water_quality_cache = FileResultCache(
+        f"{PREPROCESS_CACHE_DIR}/sea_water_quality", SEA_WATER_QUALITY_CACHE_VERSION
+    )
+
     location_df = _preprocess_location_data()
-    _preprocess_air_quality_data(location_df)
-    _preprocess_sea_water_quality_data()
+    _preprocess_air_quality_data(location_df, air_quality_cache)
+    _preprocess_sea_water_quality_data(sea_water_quality_cache)
+    air_quality_cache.save()
+    sea_water_quality_cache.save()
+    build_columnar_data()
+
+
+def _data_version(paths: list[str], salt: str = "") -> str:
+    digest = hashlib.sha256(salt.encode())
+    for path in paths:
+        with open(path, "rb") as f:
+            digest.update(f.read())
+
+    return digest.hexdigest()[:16]
+
+
+def _read_tsv_data() -> dict[str, pd.DataFrame]:
+    location = pd.read_csv(f"{DATA_DIR}/location.tsv", sep="\t")
+    location["multi_polygons"] = location["multi_polygons"].map(json.loads)
+    # The lower levels of detail are computed once here, they are kept in the columnar copy
+    for detail, tolerance in LOCATION_DETAIL_TOLERANCES.items():
+        location[f"multi_polygons_{detail}"] = simplify_multi_polygons(
+            location["multi_polygons"].tolist(), tolerance
+        )
+
+    return {
+        "location": location,
+        **{
+            name: pd.read_csv(f"{DATA_DIR}/{name}.tsv", sep="\t")
+            for name in _table_names()[1:]
+        },
+    }
+
+
+def _table_names() -> list[str]:
+    optional_tables = [
+        name for name in OPTIONAL_TABLES if os.path.exists(f"{DATA_DIR}/{name}.tsv")
+    ]
+    return TABLES + optional_tables
+
+
+def _multi_polygons_column(detail: LocationDetail) -> str:
+    if detail == LocationDetail.FULL:
+        return "multi_polygons"
+
+    return f"multi_polygons_{detail.value}"
+
+
+def _encode_location_bodies(
+    location: pd.DataFrame,
+) -> dict[LocationDetail, dict[str, bytes]]:
+    return {
+        detail: serialization.precompress(
+            serialization.dumps(
+                [
+                    {"name": name, "multi_polygons": multi_polygons}
+                    for name, multi_polygons in zip(
+                        location["name"], location[_multi_polygons_column(detail)]
+                    )
+                ]
+            )
+        )
+        for detail in LocationDetail
+    }
+
+
+def _without_polygons(location: pd.DataFrame) -> pd.DataFrame:
+    # The polygons are only served as the encoded bodies, so they are not kept in the table
+    return location.drop(
+        columns=[column for column in location if column.startswith("multi_polygons")]
+    )
+
+
+def _write_location_bodies(directory: str, location: pd.DataFrame) -> None:
+    for detail, bodies in _encode_location_bodies(location).items():
+        for encoding, body in bodies.items():
+            with open(_location_body_path(directory, detail, encoding), "wb") as f:
+                f.write(body)
+
+
+def _read_location_bodies(
+    directory: str,
+) -> dict[LocationDetail, dict[str, memoryview]]:
+    bodies = {}
+    for detail in LocationDetail:
+        bodies[detail] = {}
+        for encoding in LOCATION_BODY_EXTENSIONS:
+            # Memory mapped, so the pages are shared by all the processes that serve them
+            with open(_location_body_path(directory, detail, encoding), "rb") as f:
+                body = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+            bodies[detail][encoding] = memoryview(body)
+
+    return bodies
+
+
+def _location_body_path(directory: str, detail: LocationDetail, encoding: str) -> str:
+    return f"{directory}/locations.{detail.value}.{LOCATION_BODY_EXTENSIONS[encoding]}"
 
 
-def load_data() -> dict[str, pd.DataFrame | dict]:
+def _write_columnar_table(directory: str, name: str, df: pd.DataFrame) -> dict:
+    columns = {}
+    for column in df.columns:
+        if pd.api.types.is_numeric_dtype(df[column]):
+            np.save(f"{directory}/{name}.{column}.npy", df[column].to_numpy())
+            columns[column] = {"kind": "numeric"}
+        else:
+            # Text columns have few distinct values (locations, dates), so they are stored as codes
+            codes, categories = pd.factorize(df[column])
+            np.save(f"{directory}/{name}.{column}.npy", codes.astype(np.int32))
+            columns[column] = {"kind": "text", "categories": categories.tolist()}
+
+    return {"rows": len(df), "columns": columns}
+
+
+def _read_columnar_table(directory: str, name: str, table: dict) -> pd.DataFrame:
+    columns = {}
+    for column, spec in table["columns"].items():
+        path = f"{directory}/{name}.{column}"
+        if spec["kind"] == "numeric":
+            # Memory mapped, so the pages are shared by all the processes that load them
+            columns[column] = np.load(f"{path}.npy", mmap_mode="r")
+        else:
+            codes = np.load(f"{path}.npy")
+            categories = pd.Index(spec["categories"], dtype="str")
+            columns[column] = pd.Categorical.from_codes(codes, categories).astype("str")
+
+    return pd.DataFrame(columns, copy=False)
+
+
+def write_columnar_data(tables: dict[str, pd.DataFrame], source_version: str) -> int:
+    """
+    Write the tables as the next generation of the columnar copy. The generation is written in its own directory
+    and then made current by replacing the manifest with a single rename, so processes that load the data
+    concurrently either see the previous complete copy or the new one.
+    The location polygons are written as the encoded and compressed `/locations` bodies of every level of detail.
+
+    Args:
+        tables (dict[str, pd.DataFrame]): The location, air quality and sea water quality tables (and the optional ones).
+        source_version (str): The version of the TSV files the tables come from.
+
+    Returns:
+        int: The generation of the written copy.
+    """
+
+    os.makedirs(COLUMNAR_DIR, exist_ok=True)
+    generation = (data_generation() or 0) + 1
+    directory = tempfile.mkdtemp(prefix=".generation-", dir=COLUMNAR_DIR)
+    try:
+        _write_location_bodies(directory, tables["location"])
+        tables = {**tables, "location": _without_polygons(tables["location"])}
+        manifest = {
+            "source_version": source_version,
+            "columnar_version": COLUMNAR_VERSION,
+            "generation": generation,
+            "tables": {
+                name: _write_columnar_table(directory, name, df)
+                for name, df in tables.items()
+            },
+        }
+        # `mkdtemp` only lets the owner in, but the copy is read by the processes of other users too
+        os.chmod(directory, 0o755)
+        # Fails if another process has written the same generation in the meantime
+        os.rename(directory, f"{COLUMNAR_DIR}/{generation}")
+    finally:
+        shutil.rmtree(directory, ignore_errors=True)
+
+    with open(f"{COLUMNAR_DIR}/.manifest-{generation}.json", "w") as f:
+        json.dump(manifest, f)
+    os.replace(f"{COLUMNAR_DIR}/.manifest-{generation}.json", MANIFEST_PATH)
+
+    # The previous generation is kept, processes may still be loading it
+    for name in os.listdir(COLUMNAR_DIR):
+        if name.isdigit() and int(name) < generation - 1:
+            shutil.rmtree(f"{COLUMNAR_DIR}/{name}", ignore_errors=True)
+
+    return generation
+
+
+def _read_manifest() -> dict | None:
+    try:
+        with open(MANIFEST_PATH, "r") as f:
+            return json.load(f)
+    except (OSError, ValueError):
+        return None
+
+
+def _read_columnar_data(manifest: dict) -> dict[str, pd.DataFrame]:
+    return {
+        name: _read_columnar_table(
+            f"{COLUMNAR_DIR}/{manifest['generation']}", name, table
+        )
+        for name, table in manifest["tables"].items()
+    }
+
+
+def data_generation() -> int | None:
+    """
+    Get the generation of the current columnar copy of the data, it's increased on every write of the copy.
+
+    Returns:
+        int | None: The generation, or None if there is no columnar copy.
+    """
+
+    manifest = _read_manifest()
+    return manifest["generation"] if manifest is not None else None
+
+
+def generation_file(data: dict, name: str, build: Callable[[str], None]) -> str | None:
+    """
+    Get the path of a file derived from the data, kept in the directory of the columnar copy they were loaded from.
+    The first process that needs the file builds it into a temporary file of its own, which is then renamed
+    into place, so it's built once per generation and every other process only reads it.
+
+    Args:
+        data (dict): The snapshot returned by `load_data`.
+        name (str): The name of the file, it should change when the way it's built changes.
+        build (Callable[[str], None]): The function that writes the file to the path it's called with.
+
+    Returns:
+        str | None: The path of the file, or None if the data don't come from a columnar copy
+            or the file could not be written.
+    """
+
+    if data["generation"] is None:
+        return None
+
+    path = f"{COLUMNAR_DIR}/{data['generation']}/{name}"
+    if not os.path.exists(path):
+        temporary_path = f"{path}.{os.getpid()}.tmp"
+        try:
+            with suppress(FileNotFoundError):
+                os.remove(temporary_path)
+            build(temporary_path)
+            os.replace(temporary_path, path)
+        # Not only OSError, e.g. SQLite reports a full disk with its own errors, the caller builds the state in memory
+        except Exception as e:
+            print(f"Could not write {name}:", e)
+            with suppress(OSError):
+                os.remove(temporary_path)
+            return None
+
+    return path
+
+
+def build_columnar_data() -> None:
+    """
+    Write the columnar copy of the preprocessed TSV files.
+    """
+
+    write_columnar_data(_read_tsv_data(), _tsv_version())
+
+
+def _tsv_version() -> str:
+    return _data_version(
+        [f"{DATA_DIR}/{name}.tsv" for name in _table_names()], COLUMNAR_VERSION
+    )
+
+
+def load_data(shared: bool = False) -> dict[str, pd.DataFrame | dict]:
     """
     This function downloads the preprocessed TSV data from Github Releases and decompresses it.
-    Then it loads the data into dataframes and sometimes into dictionaries to make API faster to return them instantly.
+    Then it loads the data into dataframes, and the locations into their encoded and compressed `/locations` bodies
+    (`location_bodies`, per level of detail and content coding) to make API faster to return them instantly.
+    The data are memory-mapped from the columnar copy when it's up to date with the TSV files,
+    otherwise they are parsed from the TSV files and the columnar copy is (re)written for the next time.
+    The data also get a `version`, a hash of the loaded files, so caches can tell when the data have changed,
+    and the `generation` of the columnar copy they were loaded from.
+    Then, every hook registered with `on_load` is called with the loaded data, so derived state is rebuilt.
+    Finally, the new snapshot replaces the current one (see `get_data`) with a single assignment,
+    so requests that are already running keep using the previous one.
+
+    Args:
+        shared (bool): Whether to only attach to the columnar copy written by another process,
+            without checking it against (or falling back to) the TSV files.
+
+    Returns:
+        dict[str, pd.DataFrame | dict]: The loaded data.
+
+    Raises:
+        RuntimeError: If `shared` is set and there is no columnar copy.
     """
 
-    location = pd.read_csv(f"{DATA_DIR}/location.tsv", sep="\t")
-    location["multi_polygons"] = location["multi_polygons"].map(json.loads)
+    manifest = _read_manifest()
+    if shared:
+        if manifest is None or manifest.get("columnar_version") != COLUMNAR_VERSION:
+            raise RuntimeError(
+                "There is no (up to date) columnar data to attach to, run `python -m backend.data columnar` first."
+            )
+        source_version = manifest["source_version"]
+    else:
+        source_version = _tsv_version()
+
+    # A copy written from other TSV files is stale
+    if manifest is not None and manifest["source_version"] == source_version:
+        tables = _read_columnar_data(manifest)
+        generation = manifest["generation"]
+        location_bodies = _read_location_bodies(f"{COLUMNAR_DIR}/{generation}")
+    else:
+        tables = _read_tsv_data()
+        generation = None
+        try:
+            generation = write_columnar_data(tables, source_version)
+        except OSError as e:
+            print("Could not write the columnar data:", e)
+
+        if generation is not None:
+            location_bodies = _read_location_bodies(f"{COLUMNAR_DIR}/{generation}")
+        else:
+            location_bodies = _encode_location_bodies(tables["location"])
+        tables["location"] = _without_polygons(tables["location"])
 
     with open(f"{DATA_DIR}/prompt.txt", "r") as f:
         prompt = f.read()
 
-    return {
-        "location": location,
-        "location_dict": location.to_dict(orient="records"),
-        "air_quality": pd.read_csv(f"{DATA_DIR}/air_quality.tsv", sep="\t"),
-        "sea_water_quality": pd.read_csv(f"{DATA_DIR}/sea_water_quality.tsv", sep="\t"),
+    data = {
+        "location": tables["location"],
+        "location_bodies": location_bodies,
+        "air_quality": tables["air_quality"],
+        "sea_water_quality": tables["sea_water_quality"],
+        "air_quality_daily": tables.get("air_quality_daily"),
         "prompt": prompt,
+        "version": _data_version([f"{DATA_DIR}/prompt.txt"], source_version),
+        "generation": generation,
     }
 
+    for hook in _load_hooks:
+        hook(data)
+
+    global _current_data
+    _current_data = data
+    return data
+
 
 if __name__ == "__main__":
-    preprocess_data()
+    if sys.argv[1:] == ["columnar"]:
+        build_columnar_data()
+    else:
+        preprocess_data()
@@ -0,0 +1,116 @@
+"""
+This module formats the results of the chat tool queries before they are fed back to the LLM.
+
+The whole result goes back into the prompt of the next model call, and the prompt length is the main driver
+of the latency of a turn, so the result is formatted in the most detailed representation that fits
+a token budget: an aligned table, then CSV (no padding), then the first/last rows with per column statistics,
+then grouped rollups, and as a last resort a cut version of the most compact one.
+"""
+
+import pandas as pd
+
+# A rough, conservative estimation for tables of numbers, which tokenize worse than prose
+CHARS_PER_TOKEN = 3
+
+# The number of first/last rows kept by the summary representation, tried from the most detailed
+SUMMARY_ROWS = [10, 5, 2]
+
+# The columns a result is grouped by for the rollup representation, the first one present wins
+ROLLUP_COLUMNS = ["location", "year"]
+
+# The CSV representations keep 6 significant digits, like the table does, instead of the full precision
+FLOAT_FORMAT = "%.6g"
+
+
+def estimate_tokens(text: str) -> int:
+    """
+    Estimate the number of tokens the text will take in the prompt.
+
+    Args:
+        text (str): The text to estimate.
+
+    Returns:
+        int: The estimated number of tokens.
+    """
+
+    return -(-len(text) // CHARS_PER_TOKEN)
+
+
+def format_result(df: pd.DataFrame, truncated: bool, token_budget: int) -> str:
+    """
+    Format a query result as text, in the most detailed representation that fits the token budget.
+
+    Args:
+        df (pd.DataFrame): The (possibly truncated) result of the query.
+        truncated (bool): Whether the result had more rows than the dataframe holds.
+        token_budget (int): The maximum number of tokens the text should take.
+
+    Returns:
+        str: The formatted result.
+    """
+
+    note = "\n... more rows truncated" if truncated else ""
+
+    candidates = [
+        lambda: df.to_string(index=False) + note,
+        lambda: df.to_csv(index=False, float_format=FLOAT_FORMAT).rstrip("\n") + note,
+        *(lambda rows=rows: _summary(df, truncated, rows) for rows in SUMMARY_ROWS),
+        lambda: _rollup(df, truncated),
+    ]
+
+    text = ""
+    for candidate in candidates:
+        text = candidate() or text
+        if estimate_tokens(text) <= token_budget:
+            return text
+
+    cut = text[: token_budget * CHARS_PER_TOKEN].rsplit("\n", 1)[0]
+    return cut + "\n... (output cut to fit the token budget)"
+
+
+def _statistics(df: pd.DataFrame) -> str:
+    numeric = df.select_dtypes("number")
+    if numeric.empty:
+        return ""
+
+    return (
+        numeric.agg(["min", "mean", "max"])
+        .to_csv(float_format=FLOAT_FORMAT)
+        .rstrip("\n")
+    )
+
+
+def _summary(df: pd.DataFrame, truncated: bool, rows: int) -> str:
+    if len(df) <= 2 * rows:
+        return ""
+
+    total = f"More than {len(df)}" if truncated else str(len(df))
+    parts = [
+        f"{total} rows, showing the first and the last {rows}:",
+        df.head(rows).to_csv(index=False, float_format=FLOAT_FORMAT).rstrip("\n"),
+        "...",
+        df.tail(rows)
+        .to_csv(index=False, header=False, float_format=FLOAT_FORMAT)
+        .rstrip("\n"),
+    ]
+
+    statistics = _statistics(df)
+    if statistics:
+        scope = f" (of the first {len(df)} rows)" if truncated else ""
+        parts += [f"Column statistics{scope}:", statistics]
+
+    return "\n".join(parts)
+
+
+def _rollup(df: pd.DataFrame, truncated: bool) -> str:
+    column = next((col for col in ROLLUP_COLUMNS if col in df.columns), None)
+    numeric = df.select_dtypes("number").drop(columns=[column], errors="ignore")
+    if column is None or numeric.empty:
+        return ""
+
+    rollup = numeric.groupby(df[column]).mean()
+    rollup.insert(0, "rows", df.groupby(column).size())
+    scope = f" (of the first {len(df)} rows)" if truncated else ""
+    return f"Averages per {column}{scope}:\n" + rollup.to_csv(
+        float_format=FLOAT_FORMAT
+    ).rstrip("\n")
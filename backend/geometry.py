@@ -0,0 +1,259 @@
+"""
+This module simplifies the location polygons, for the lower levels of detail of `/locations`.
+
+The rings are simplified with the Douglas-Peucker algorithm, but not one by one: neighbouring municipalities share
+their borders, and simplifying the two copies of a border separately would open gaps and overlaps between them.
+Instead, every ring is cut into arcs at its junctions (the points where the rings it shares its points with change)
+and every distinct arc is simplified once, in a canonical direction, so a shared border is simplified to the same
+points on both sides and the junctions themselves are always kept.
+
+Simplifying every arc on its own can still make an arc cross itself or another arc, or collapse a small ring
+(an island or a hole). So the simplified arcs are checked: every arc that crosses (or touches) an arc it didn't cross
+before, and every arc of a ring that collapses or flips, is simplified again with half the tolerance,
+and after a few tries falls back to its original points, until no such arc is left.
+"""
+
+from collections import defaultdict
+
+import numpy as np
+
+Point = tuple[float, float]
+
+# How many times an arc that crosses another arc (or collapses its ring) is simplified again with half the tolerance,
+# before it falls back to its original points
+MAX_RETRIES = 4
+
+
+def simplify_multi_polygons(multi_polygons: list[list], tolerance: float) -> list[list]:
+    """
+    Simplify the multi polygons of all the locations together, so their shared borders stay shared
+    and the simplified rings don't cross each other or themselves.
+
+    Args:
+        multi_polygons (list[list]): The multi polygons (polygons of rings of [x, y] points) of every location.
+        tolerance (float): The maximum distance of a removed point from the simplified border, in coordinate units.
+
+    Returns:
+        list[list]: The simplified multi polygons, in the same order and structure.
+    """
+
+    rings = [
+        [tuple(point) for point in ring]
+        for polygons in multi_polygons
+        for polygon in polygons
+        for ring in polygon
+    ]
+    anchors = _anchors(rings)
+    ring_arcs = [_split_ring(ring, anchors) for ring in rings]
+    keys = list(dict.fromkeys(key for arcs in ring_arcs for key, _ in arcs))
+    # The source polygons are not always clean, the arcs that already cross each other are left alone
+    original_crossings = _crossing_pairs([list(key) for key in keys])
+    retries = dict.fromkeys(keys, 0)
+    simplified = {key: _douglas_peucker(key, tolerance) for key in keys}
+
+    while True:
+        crossings = _crossing_pairs([simplified[key] for key in keys])
+        invalid = {keys[i] for pair in crossings - original_crossings for i in pair}
+        for ring, arcs in zip(rings, ring_arcs):
+            if _collapsed(ring, _join_arcs(arcs, simplified)):
+                invalid.update(key for key, _ in arcs)
+
+        # Every invalid arc is simplified again with half the tolerance, and in the end left as it was
+        invalid = {key for key in invalid if retries[key] <= MAX_RETRIES}
+        if not invalid:
+            break
+        for key in invalid:
+            retries[key] += 1
+            simplified[key] = (
+                _douglas_peucker(key, tolerance / 2 ** retries[key])
+                if retries[key] <= MAX_RETRIES
+                else list(key)
+            )
+
+    simplified_rings = iter(
+        [[list(point) for point in _join_arcs(arcs, simplified)] for arcs in ring_arcs]
+    )
+    return [
+        [[next(simplified_rings) for _ in polygon] for polygon in polygons]
+        for polygons in multi_polygons
+    ]
+
+
+def _anchors(rings: list[list[Point]]) -> set[Point]:
+    # The rings every point belongs to, a point whose rings differ from the ones of a neighbouring point
+    # is where a shared border starts or ends.
+    owners: defaultdict[Point, set[int]] = defaultdict(set)
+    for i, ring in enumerate(rings):
+        for point in ring:
+            owners[point].add(i)
+
+    anchors = set()
+    for ring in rings:
+        anchors.update((ring[0], ring[-1]))
+        for previous, point, following in zip(ring, ring[1:], ring[2:]):
+            if owners[point] != owners[previous] or owners[point] != owners[following]:
+                anchors.add(point)
+
+    # A ring without any other anchor is split at its farthest point from the start,
+    # otherwise it would be simplified as a single arc that starts and ends at the same point.
+    for ring in rings:
+        if len(ring) > 2 and not anchors.intersection(ring[1:-1]):
+            points = np.array(ring)
+            distances = np.hypot(*(points - points[0]).T)
+            anchors.add(ring[int(np.argmax(distances))])
+
+    return anchors
+
+
+def _split_ring(
+    ring: list[Point], anchors: set[Point]
+) -> list[tuple[tuple[Point, ...], bool]]:
+    # The arcs of a ring between its anchors, as the arc in its canonical direction (the two copies of a shared
+    # border run in opposite directions) and whether the ring runs through it in reverse.
+    splits = [i for i, point in enumerate(ring) if point in anchors]
+    if splits[0] != 0:
+        splits.insert(0, 0)
+    if splits[-1] != len(ring) - 1:
+        splits.append(len(ring) - 1)
+
+    arcs = []
+    for start, stop in zip(splits, splits[1:]):
+        arc = tuple(ring[start : stop + 1])
+        reverse = arc[::-1] < arc
+        arcs.append((arc[::-1] if reverse else arc, reverse))
+
+    return arcs
+
+
+def _join_arcs(
+    arcs: list[tuple[tuple[Point, ...], bool]], simplified: dict[tuple, list[Point]]
+) -> list[Point]:
+    points = []
+    for key, reverse in arcs:
+        arc = simplified[key][::-1] if reverse else simplified[key]
+        points += arc[1:] if points else arc
+
+    return points
+
+
+def _douglas_peucker(arc: tuple[Point, ...], tolerance: float) -> list[Point]:
+    points = np.array(arc)
+    keep = np.zeros(len(points), dtype=bool)
+    keep[[0, -1]] = True
+    stack = [(0, len(points) - 1)]
+    while stack:
+        start, stop = stack.pop()
+        if stop - start < 2:
+            continue
+
+        distances = _segment_distances(
+            points[start + 1 : stop], points[start], points[stop]
+        )
+        farthest = int(np.argmax(distances))
+        if distances[farthest] > tolerance:
+            farthest += start + 1
+            keep[farthest] = True
+            stack += [(start, farthest), (farthest, stop)]
+
+    return [point for point, kept in zip(arc, keep) if kept]
+
+
+def _collapsed(ring: list[Point], simplified: list[Point]) -> bool:
+    # A ring collapses when it's left with less than 3 distinct points or no area,
+    # and it flips when its area changes sign (it turned inside out).
+    if len(set(simplified)) < 3 or (ring[0] == ring[-1] and len(simplified) < 4):
+        return True
+
+    area = _signed_area(simplified)
+    return area == 0 or (area > 0) != (_signed_area(ring) > 0)
+
+
+def _signed_area(ring: list[Point]) -> float:
+    x, y = np.array(ring).T
+    return float(x @ np.roll(y, -1) - y @ np.roll(x, -1)) / 2
+
+
+def _crossing_pairs(arcs: list[list[Point]]) -> set[tuple[int, int]]:
+    # The pairs of indices (in order) of the arcs with segments that cross or touch each other,
+    # other than at the points they share as neighbouring segments or at their ends.
+    starts = np.array([point for arc in arcs for point in arc[:-1]])
+    stops = np.array([point for arc in arcs for point in arc[1:]])
+    owners = np.array([i for i, arc in enumerate(arcs) for _ in arc[1:]])
+    lows, highs = np.minimum(starts, stops), np.maximum(starts, stops)
+
+    # Sweep along x: every segment is paired with the ones that start (in x) before it ends,
+    # and then the pairs whose bounding boxes don't overlap in y are dropped too.
+    order = np.argsort(lows[:, 0], kind="stable")
+    ends = np.searchsorted(lows[order, 0], highs[order, 0], side="right")
+    counts = ends - np.arange(len(order)) - 1
+    first = np.repeat(np.arange(len(order)), counts)
+    second = (
+        first
+        + 1
+        + np.arange(len(first))
+        - np.repeat(np.cumsum(counts) - counts, counts)
+    )
+    i, j = order[first], order[second]
+    overlap = (lows[i, 1] <= highs[j, 1]) & (lows[j, 1] <= highs[i, 1])
+    i, j = i[overlap], j[overlap]
+
+    touch = _segments_touch(starts[i], stops[i], starts[j], stops[j])
+    return set(
+        zip(
+            np.minimum(owners[i], owners[j])[touch].tolist(),
+            np.maximum(owners[i], owners[j])[touch].tolist(),
+        )
+    )
+
+
+def _segments_touch(
+    a: np.ndarray, b: np.ndarray, c: np.ndarray, d: np.ndarray
+) -> np.ndarray:
+    # Whether every pair of segments (a, b) and (c, d) has a point in common other than an endpoint they share
+    ac, ad = (a == c).all(axis=1), (a == d).all(axis=1)
+    bc, bd = (b == c).all(axis=1), (b == d).all(axis=1)
+
+    # Segments that share an endpoint only touch elsewhere if they overlap,
+    # i.e. their other endpoints are on the same side of it, on the same line
+    point = np.where((ac | ad)[:, None], a, b)
+    u = np.where((ac | ad)[:, None], b, a)
+    v = np.where((ac | bc)[:, None], d, c)
+    overlapping = (_orientation(point, u, v) == 0) & (
+        ((u - point) * (v - point)).sum(axis=1) > 0
+    )
+
+    o1, o2 = _orientation(a, b, c), _orientation(a, b, d)
+    o3, o4 = _orientation(c, d, a), _orientation(c, d, b)
+    crossing = ((o1 * o2 < 0) & (o3 * o4 < 0)) | (
+        ((o1 == 0) & _on_segment(a, b, c))
+        | ((o2 == 0) & _on_segment(a, b, d))
+        | ((o3 == 0) & _on_segment(c, d, a))
+        | ((o4 == 0) & _on_segment(c, d, b))
+    )
+
+    shared = ac.astype(int) + ad + bc + bd
+    return np.where(shared >= 2, True, np.where(shared == 1, overlapping, crossing))
+
+
+def _orientation(a: np.ndarray, b: np.ndarray, c: np.ndarray) -> np.ndarray:
+    return np.sign(
+        (b[:, 0] - a[:, 0]) * (c[:, 1] - a[:, 1])
+        - (b[:, 1] - a[:, 1]) * (c[:, 0] - a[:, 0])
+    )
+
+
+def _on_segment(a: np.ndarray, b: np.ndarray, point: np.ndarray) -> np.ndarray:
+    # Whether points that are collinear with segments lie on them
+    return ((np.minimum(a, b) <= point) & (point <= np.maximum(a, b))).all(axis=1)
+
+
+def _segment_distances(
+    points: np.ndarray, start: np.ndarray, stop: np.ndarray
+) -> np.ndarray:
+    segment = stop - start
+    length = segment @ segment
+    if length == 0:
+        return np.hypot(*(points - start).T)
+
+    t = np.clip((points - start) @ segment / length, 0, 1)
+    return np.hypot(*(points - start - t[:, None] * segment).T)
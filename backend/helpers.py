@@ -1,5 +1,32 @@
+from datetime import date
+from typing import Iterable
+import hashlib
+
+import numpy as np
 import pandas as pd
 
+AIR_QUALITY_COLUMNS = [
+    "co",
+    "no",
+    "no2",
+    "so2",
+    "o3",
+    "air_quality_index",
+]
+
+SEA_WATER_QUALITY_COLUMNS = [
+    "temperature",
+    "dissolved_oxygen",
+    "dissolved_oxygen_percentage",
+    "ph",
+    "arsenic",
+    "lead",
+    "cadmium",
+    "nickel",
+    "copper",
+    "water_quality_index",
+]
+
 
 def rename_colors_to_avg(df: pd.DataFrame, cols: list[str]) -> pd.DataFrame:
     """
@@ -27,17 +54,7 @@ def rename_air_quality_columns(df: pd.DataFrame) -> pd.DataFrame:
         pd.DataFrame: The DataFrame with renamed columns.
     """
 
-    return rename_colors_to_avg(
-        df,
-        [
-            "co",
-            "no",
-            "no2",
-            "so2",
-            "o3",
-            "air_quality_index",
-        ],
-    )
+    return rename_colors_to_avg(df, AIR_QUALITY_COLUMNS)
 
 
 def rename_sea_water_quality_columns(df: pd.DataFrame) -> pd.DataFrame:
@@ -51,18 +68,135 @@ def rename_sea_water_quality_columns(df: pd.DataFrame) -> pd.DataFrame:
         pd.DataFrame: The DataFrame with renamed columns.
     """
 
-    return rename_colors_to_avg(
-        df,
-        [
-            "temperature",
-            "dissolved_oxygen",
-            "dissolved_oxygen_percentage",
-            "ph",
-            "arsenic",
-            "lead",
-            "cadmium",
-            "nickel",
-            "copper",
-            "water_quality_index",
-        ],
-    )
+    return rename_colors_to_avg(df, SEA_WATER_QUALITY_COLUMNS)
+
+
+def nan_to_none(values: np.ndarray) -> list:
+    """
+    Convert a numeric array to (nested) lists, with NaN values replaced by None so they are valid JSON.
+
+    Args:
+        values (np.ndarray): The array to convert.
+
+    Returns:
+        list: The values of the array as Python objects.
+    """
+
+    values = values.astype(object)
+    values[pd.isna(values)] = None
+    return values.tolist()
+
+
+def to_avg_records(
+    locations: np.ndarray, values: np.ndarray, cols: list[str]
+) -> list[dict]:
+    """
+    Build the records of a data view from per location averages, with 'avg_' prefixed keys and NaN as None.
+
+    Args:
+        locations (np.ndarray): The location of each row.
+        values (np.ndarray): The averages with shape (locations, columns).
+        cols (list[str]): The column names of the averages.
+
+    Returns:
+        list[dict]: The records, one per location.
+    """
+
+    keys = [f"avg_{col}" for col in cols]
+    return [
+        {"location": location, **dict(zip(keys, row))}
+        for location, row in zip(locations, nan_to_none(values))
+    ]
+
+
+def period_label(start: date, resolution: str) -> str:
+    """
+    Label a period the same way everywhere in the API, e.g. `2023`, `2023-Q1`, `2023-03`, `2023-W09`
+    (ISO weeks, they start on Monday) or `2023-03-05`.
+
+    Args:
+        start (date): The first day of the period.
+        resolution (str): The resolution of the period (day, week, month, quarter or year).
+
+    Returns:
+        str: The label of the period.
+    """
+
+    if resolution == "year":
+        return f"{start.year}"
+    if resolution == "quarter":
+        return f"{start.year}-Q{(start.month - 1) // 3 + 1}"
+    if resolution == "month":
+        return f"{start.year}-{start.month:02}"
+    if resolution == "week":
+        year, week, _ = start.isocalendar()
+        return f"{year}-W{week:02}"
+
+    return start.isoformat()
+
+
+def etag(*parts: object) -> str:
+    """
+    Build a strong ETag out of the parts that fully determine a response body.
+
+    Args:
+        *parts (object): The values the response body depends on (e.g. the data version and the query).
+
+    Returns:
+        str: The quoted ETag.
+    """
+
+    digest = hashlib.sha256(":".join(map(str, parts)).encode()).hexdigest()
+    return f'"{digest[:32]}"'
+
+
+def etag_matches(if_none_match: str | None, etag: str) -> bool:
+    """
+    Check whether an If-None-Match header matches an ETag, with the weak comparison of RFC 9110.
+
+    Args:
+        if_none_match (str | None): The value of the If-None-Match header, if any.
+        etag (str): The current ETag of the resource.
+
+    Returns:
+        bool: Whether the client already has the current representation.
+    """
+
+    if not if_none_match:
+        return False
+
+    tags = [tag.strip().removeprefix("W/") for tag in if_none_match.split(",")]
+    return "*" in tags or etag in tags
+
+
+def negotiate_encoding(accept_encoding: str | None, encodings: Iterable[str]) -> str:
+    """
+    Pick the content coding of a response from the Accept-Encoding header of the request.
+    The first acceptable one of the available codings is picked, so they must be given in the order of preference.
+
+    Args:
+        accept_encoding (str | None): The value of the Accept-Encoding header, if any.
+        encodings (Iterable[str]): The available content codings, including `identity`.
+
+    Returns:
+        str: The picked content coding, `identity` when none of the others is acceptable.
+    """
+
+    qualities = {}
+    for item in (accept_encoding or "").split(","):
+        coding, _, parameters = item.partition(";")
+        quality = 1.0
+        for parameter in parameters.split(";"):
+            name, _, value = parameter.partition("=")
+            if name.strip().lower() == "q":
+                try:
+                    quality = float(value)
+                except ValueError:
+                    quality = 0.0
+        qualities[coding.strip().lower()] = quality
+
+    for encoding in encodings:
+        if qualities.get(encoding, qualities.get("*", 0.0)) > 0:
+            return encoding
+
+    return "identity"
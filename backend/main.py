@@ -1,30 +1,76 @@
 """
-Because of an Issue with Ollama, we can't stream the response when using tools, so we will return it as a single message.
-When this is fixed: https://github.com/ollama/ollama/issues/9632 we can use the streaming response and send the messages as they come in with websockets.
+The `/chat` endpoint returns the answer of the assistant as a single message, once the whole tool loop is done.
+The `/chat/stream` endpoint runs the same loop, but sends its progress as server-sent events while it happens:
+tool calls, tool results and the tokens of the answer (Ollama streams them, tool calls included, since
+https://github.com/ollama/ollama/issues/9632 was fixed).
 
 At this point, the messages are sent to the frontend, If the frontend wants, it can mess with assistant messages because they're not stored in the backend.
 We just choose to ignore because the app is not production ready.
 """
 
+from contextlib import asynccontextmanager, suppress
 from datetime import date
+from typing import AsyncIterator
+import asyncio
+import hashlib
+import json
+import secrets
+import time
 
 from dotenv import dotenv_values
 from fastapi.middleware.cors import CORSMiddleware
-from fastapi import FastAPI, Query, Body, status
-from fastapi.responses import JSONResponse
-from pandasql import sqldf
+from fastapi import FastAPI, Query, Body, Request, Response, status
+from fastapi.concurrency import run_in_threadpool
+from fastapi.responses import JSONResponse, StreamingResponse
 import numpy as np
-import pandas as pd
 import ollama
 
-from .schemas import Location, Report, DateRange, ReportInvalidRange, MessageList
-from .data import load_data
+from .schemas import (
+    Location,
+    Report,
+    DateRange,
+    ReportInvalidRange,
+    MessageList,
+    Resolution,
+    LocationDetail,
+    LocationName,
+    TimeSeries,
+    TimeSeriesResolution,
+)
+from .data import data_generation, get_data, load_data, on_load, use_data
+from .cube import MonthlyCube, month_window
+from .cache import LRUCache, PersistentLRUCache
+from . import serialization
+from . import segments  # Registers the `segments` of every data snapshot
+from . import timeseries  # Registers the `timeseries` store of every data snapshot
+from .sql import normalize_query, time_budget
+from .formatting import format_result
+from .scheduler import LLMScheduler, QueueFull
+from .warmup import ModelWarmer
 from . import helpers
 
 
 CONFIG = dotenv_values(".env")
 
-app = FastAPI(root_path="/api")
+
+@asynccontextmanager
+async def lifespan(app: FastAPI) -> AsyncIterator[None]:
+    # Keep the chat model warm in the background for as long as the app runs
+    tasks = []
+    if CONFIG.get("OLLAMA_WARMUP", "true").lower() == "true":
+        tasks.append(asyncio.create_task(model_warmer.run()))
+    # Reload the data when a newer generation of the columnar copy is written
+    if DATA_WATCH_INTERVAL > 0:
+        tasks.append(asyncio.create_task(_watch_data()))
+
+    yield
+    for task in tasks:
+        task.cancel()
+        with suppress(asyncio.CancelledError):
+            await task
+
+
+app = FastAPI(root_path="/api", lifespan=lifespan)
 app.add_middleware(
     CORSMiddleware,
     allow_origins="*",
@@ -33,21 +79,116 @@ app.add_middleware(
     allow_headers=["*"],
 )
 
-data = load_data()
-knowledge_prompt = data["prompt"]
-location_dict, air_quality, sea_water_quality, system_prompt = (
-    data["location_dict"],
-    data["air_quality"],
-    data["sea_water_quality"],
-    data["prompt"],
+# Whole /report bodies are cached per (month window, data version), the cache is emptied on every data load.
+report_cache = LRUCache(maxsize=int(CONFIG.get("REPORT_CACHE_SIZE", 256)))
+REPORT_CACHE_CONTROL = f"public, max-age={CONFIG.get('REPORT_CACHE_MAX_AGE', 300)}"
+LOCATIONS_CACHE_CONTROL = (
+    f"public, max-age={CONFIG.get('LOCATIONS_CACHE_MAX_AGE', 86400)}"
 )
+on_load(lambda _: report_cache.clear())
+
+# When enabled, report bodies are encoded straight from the precomputed data with orjson,
+# without validating them against the `Report` model (the OpenAPI schema is not affected).
+REPORT_TRUSTED_SERIALIZATION = (
+    CONFIG.get("REPORT_TRUSTED_SERIALIZATION", "false").lower() == "true"
+)
+
+# With many workers, the columnar data can be written once before they start (`python -m backend.data columnar`)
+# and the workers only attach to it, so they all share the same memory-mapped columns.
+DATA_SHARED = CONFIG.get("DATA_SHARED", "false").lower() == "true"
+
+# The data are reloaded without a restart, through the admin endpoint (with the admin token)
+# or by checking for a newer generation of the columnar copy every few seconds (0 turns it off).
+ADMIN_TOKEN = CONFIG.get("ADMIN_TOKEN")
+DATA_WATCH_INTERVAL = float(CONFIG.get("DATA_WATCH_INTERVAL", 0))
+
+
+# The range dependent averages of the report are answered by cubes that are built once per data load.
+@on_load
+def _build_cubes(data: dict) -> None:
+    air_quality, sea_water_quality = data["air_quality"], data["sea_water_quality"]
+    data["air_quality_cube"] = MonthlyCube(
+        air_quality,
+        [col for col in helpers.AIR_QUALITY_COLUMNS if col in air_quality.columns],
+    )
+    data["sea_water_quality_cube"] = MonthlyCube(
+        sea_water_quality,
+        [
+            col
+            for col in helpers.SEA_WATER_QUALITY_COLUMNS
+            if col in sea_water_quality.columns
+        ],
+    )
+
+
+ollama_client = ollama.AsyncClient(host=CONFIG.get("OLLAMA_HOST"))
+
+# Bounds the concurrent conversations with the model, see the `scheduler` module
+chat_scheduler = LLMScheduler(
+    concurrency=int(CONFIG.get("CHAT_CONCURRENCY", 2)),
+    max_queue=int(CONFIG.get("CHAT_MAX_QUEUE", 16)),
+)
+
+# Guardrails for the queries the LLM writes, see the `sql` module
+SQL_QUERY_TIMEOUT = float(CONFIG.get("SQL_QUERY_TIMEOUT", 5))
+SQL_MAX_ROWS = int(CONFIG.get("SQL_MAX_ROWS", 500))
+CHAT_TOOLS_TIME_BUDGET = float(CONFIG.get("CHAT_TOOLS_TIME_BUDGET", 20))
+
+# Every tool only reads its own table, like when every tool ran on a database with just its table
+TOOL_TABLES = {
+    "query_air_quality_data": ["air_quality"],
+    "sea_water_quality_data": ["sea_water_quality"],
+}
+
+# The maximum (estimated) number of tokens the result of each tool may take in the prompt, see the `formatting` module
+TOOL_TOKEN_BUDGETS = {
+    "query_air_quality_data": int(CONFIG.get("AIR_QUALITY_TOOL_TOKEN_BUDGET", 1500)),
+    "sea_water_quality_data": int(
+        CONFIG.get("SEA_WATER_QUALITY_TOOL_TOKEN_BUDGET", 1000)
+    ),
+}
+
+
+# Successful tool results are cached per (tool, normalized query, data version), the cache is emptied on every data load.
+tool_cache = LRUCache(maxsize=int(CONFIG.get("TOOL_CACHE_SIZE", 512)))
+on_load(lambda _: tool_cache.clear())
+
+
+# The start of the result of a tool call that failed
+TOOL_ERROR = "Error executing SQL query:"
 
-ollama_client = ollama.Client(host=CONFIG.get("OLLAMA_HOST"))
+
+def _run_tool_query(tool_name: str, sql_query: str) -> str:
+    print("Executing SQL query:", sql_query)
+    data = get_data()
+    key = (tool_name, normalize_query(sql_query), data["version"])
+    cached_result = tool_cache.get(key)
+    if cached_result is not None:
+        print("Result of SQL Query (cached)")
+        return cached_result
+
+    try:
+        result_df, truncated = data["engine"].query(
+            sql_query,
+            timeout=SQL_QUERY_TIMEOUT,
+            max_rows=SQL_MAX_ROWS,
+            tables=TOOL_TABLES[tool_name],
+        )
+        print("Result of SQL Query", result_df)
+        if result_df.empty:
+            return "No data found."
+
+        result = format_result(result_df, truncated, TOOL_TOKEN_BUDGETS[tool_name])
+        tool_cache.set(key, result)
+        return result
+    except Exception as e:
+        print(TOOL_ERROR, e)
+        return f"{TOOL_ERROR} {e}"
 
 
 def query_air_quality_data(sql_query: str) -> str:
     """
-    Execute a SQL query on the air quality data using pandasql.
+    Execute a SQL query on the air quality data using SQLite.
 
     Most likely, the user will ask for a fuzzy location name, try to make queries for all locations (or using regexes/ilikes) and then decide best on your logic.
     E.g when user wants results for "Ampelokipi - Menemeni Municipality", the user might ask for "Ampelokipi" or "Menemeni".
@@ -64,24 +205,12 @@ def query_air_quality_data(sql_query: str) -> str:
     Returns:
         str: The result of the query as a string (table format).
     """
-    print("Executing SQL query:", sql_query)
-    try:
-        local_vars = {"air_quality": air_quality.copy()}
-        result_df = sqldf(sql_query, local_vars)
-        print("Result of SQL Query", result_df)
-        return (
-            result_df.to_string(index=False)
-            if not result_df.empty
-            else "No data found."
-        )
-    except Exception as e:
-        print("Error executing SQL query:", e)
-        return f"Error executing SQL query: {e}"
+    return _run_tool_query("query_air_quality_data", sql_query)
 
 
 def sea_water_quality_data(sql_query: str) -> str:
     """
-    Execute a SQL query on the sea water quality data using pandasql.
+    Execute a SQL query on the sea water quality data using SQLite.
 
     Most likely, the user will ask for a fuzzy location name, try to make queries for all locations (or using regexes/ilikes) and then decide best on your logic.
     E.g when user wants results for "Thermaikos Port", the user might ask for "Thermaikos" or "Port".
@@ -98,20 +227,7 @@ def sea_water_quality_data(sql_query: str) -> str:
     Returns:
         str: The result of the query as a string (table format).
     """
-
-    print("Executing SQL query:", sql_query)
-    try:
-        local_vars = {"sea_water_quality": sea_water_quality.copy()}
-        result_df = sqldf(sql_query, local_vars)
-        print("Result of SQL Query", result_df)
-        return (
-            result_df.to_string(index=False)
-            if not result_df.empty
-            else "No data found."
-        )
-    except Exception as e:
-        print("Error executing SQL query:", e)
-        return f"Error executing SQL query: {e}"
+    return _run_tool_query("sea_water_quality_data", sql_query)
 
 
 available_tools = {
@@ -122,42 +238,85 @@ available_tools = {
 MODEL_NAME = "qwen3:8b"
 CHAT_OPTIONS = {"temperature": 0}
 CHAT_TOOLS = available_tools.values()
-system_prompt = (
-    query_air_quality_data.__doc__
-    + "\n\n"
-    + sea_water_quality_data.__doc__
-    + "\n\n"
-    + system_prompt
+CHAT_KEEP_ALIVE = CONFIG.get("OLLAMA_KEEP_ALIVE", "30m")
+
+
+@on_load
+def _build_system_prompt(data: dict) -> None:
+    data["system_prompt"] = (
+        query_air_quality_data.__doc__
+        + "\n\n"
+        + sea_water_quality_data.__doc__
+        + "\n\n"
+        + data["prompt"]
+    )
+
+
+load_data(shared=DATA_SHARED)
+
+model_warmer = ModelWarmer(
+    ollama_client,
+    MODEL_NAME,
+    lambda: get_data()["system_prompt"],
+    tools=CHAT_TOOLS,
+    options=CHAT_OPTIONS,
+    keep_alive=CHAT_KEEP_ALIVE,
+    interval=float(CONFIG.get("OLLAMA_WARMUP_INTERVAL", 300)),
 )
 
 
 @app.get("/locations")
-def locations() -> list[Location]:
-    return location_dict
+def locations(
+    request: Request, detail: LocationDetail = Query(LocationDetail.FULL)
+) -> list[Location]:
+    """
+    Get the locations with their polygons, simplified for the low and medium levels of detail.
+    Neighbouring locations still share their borders at every level of detail.
+    The body is served as it was encoded and compressed when the columnar copy of the data was written,
+    without any validation.
+    """
+
+    data = get_data()
+    bodies = data["location_bodies"][detail]
+    encoding = helpers.negotiate_encoding(
+        request.headers.get("accept-encoding"), bodies
+    )
+    # Every content coding is a different representation, so it gets its own (strong) ETag
+    etag = helpers.etag(data["version"], detail.value, encoding)
+    headers = {
+        "ETag": etag,
+        "Cache-Control": LOCATIONS_CACHE_CONTROL,
+        "Vary": "Accept-Encoding",
+    }
+
+    if helpers.etag_matches(request.headers.get("if-none-match"), etag):
+        return Response(status_code=status.HTTP_304_NOT_MODIFIED, headers=headers)
+
+    if encoding != "identity":
+        headers["Content-Encoding"] = encoding
+    return Response(
+        content=bodies[encoding], media_type="application/json", headers=headers
+    )
 
 
 @app.get(f"/date-range")
 def date_range() -> DateRange:
-    min_air_quality_date = pd.to_datetime(air_quality["date"].min())
-    min_sea_water_quality_date = pd.to_datetime(sea_water_quality["date"].min())
-    max_air_quality_date = pd.to_datetime(air_quality["date"].max())
-    max_sea_water_quality_date = pd.to_datetime(sea_water_quality["date"].max())
-
-    return {
-        "from_date": min(min_air_quality_date, min_sea_water_quality_date).date(),
-        "to_date": max(max_air_quality_date, max_sea_water_quality_date).date(),
-    }
+    return get_data()["segments"].date_range
 
 
 @app.get(
     "/report", responses={200: {"model": Report}, 422: {"model": ReportInvalidRange}}
 )
 def report(
+    request: Request,
     from_date: date = Query(example="2020-01-01"),
     to_date: date = Query(example="2024-12-01"),
+    resolution: Resolution = Query(Resolution.MONTH),
 ) -> Report:
 
-    acceptable_date_range = date_range()
+    # The whole request uses the same snapshot of the data, even if they are reloaded in the meantime
+    data = get_data()
+    acceptable_date_range = data["segments"].date_range
 
     if (
         from_date < acceptable_date_range["from_date"]
@@ -174,141 +333,151 @@ def report(
             },
         )
 
-    from_date = pd.Timestamp(from_date)
-    to_date = pd.Timestamp(to_date)
+    # Date ranges that select the same months produce the same report, so they share the cache entry and the ETag.
+    # The ETag only depends on the key, so a matching If-None-Match is answered without building the report.
+    window = month_window(from_date, to_date)
+    etag = helpers.etag(data["version"], *window, resolution.value)
+    headers = {"ETag": etag, "Cache-Control": REPORT_CACHE_CONTROL}
 
-    # Air Quality Story View
-    air_quality_story_view = air_quality.copy()
-    air_quality_story_view["period"] = air_quality_story_view["date"]
+    if helpers.etag_matches(request.headers.get("if-none-match"), etag):
+        return Response(status_code=status.HTTP_304_NOT_MODIFIED, headers=headers)
 
-    air_quality_story_view = air_quality_story_view.groupby(
-        ["location", "period"], as_index=False
-    ).mean(numeric_only=True)
-
-    air_quality_story_view = helpers.rename_air_quality_columns(air_quality_story_view)
-    air_quality_story_view = air_quality_story_view.replace(np.nan, None).to_dict(
-        orient="records"
+    content = report_cache.get_or_set(
+        (*window, resolution, data["version"]),
+        lambda: _encode_report(data, from_date, to_date, resolution),
     )
+    return Response(content=content, media_type="application/json", headers=headers)
 
-    # Water Quality Story View
-    sea_water_quality_story_view = sea_water_quality.copy()
-    sea_water_quality_story_view["period"] = sea_water_quality_story_view["date"]
 
-    sea_water_quality_story_view = sea_water_quality_story_view.groupby(
-        ["location", "period"], as_index=False
-    ).mean(numeric_only=True)
+@app.get(
+    "/timeseries",
+    responses={404: {"description": "There is no data for the metric at the location"}},
+)
+def get_timeseries(
+    location: LocationName = Query(),
+    metric: str = Query(example="air_quality_index"),
+    from_date: date | None = Query(None, alias="from", example="2020-01-01"),
+    to_date: date | None = Query(None, alias="to", example="2024-12-01"),
+    resolution: TimeSeriesResolution | None = Query(None),
+    max_points: int = Query(500, ge=3, le=10_000),
+) -> TimeSeries:
+    """
+    Get the series of a metric at a location, with the periods that start inside the date range.
+    The series comes from precomputed rollups, without a resolution the most detailed one that fits in `max_points`
+    is picked. Series with more points than `max_points` are downsampled, keeping their visual shape.
+    """
 
-    sea_water_quality_story_view = helpers.rename_sea_water_quality_columns(
-        sea_water_quality_story_view
+    series = get_data()["timeseries"].series(
+        location.value,
+        metric,
+        from_date,
+        to_date,
+        resolution.value if resolution is not None else None,
+        max_points,
     )
+    if series is None:
+        return JSONResponse(
+            status_code=status.HTTP_404_NOT_FOUND,
+            content={"error": f"There is no {metric} data for {location.value}"},
+        )
 
-    sea_water_quality_story_view = sea_water_quality_story_view.to_dict(
-        orient="records"
-    )
+    return series
 
-    # Air Quality Data View
-    air_quality_data_view = air_quality.copy()
-    air_quality_data_view["date"] = pd.to_datetime(
-        air_quality_data_view["date"], format="%Y-%m"
-    )
-    air_quality_data_view = air_quality_data_view[
-        air_quality_data_view["date"].between(from_date, to_date, inclusive="both")
-    ]
-    air_quality_data_view = air_quality_data_view.groupby(["location"], as_index=False)
-    air_quality_filtered_and_grouped = air_quality_data_view
-    air_quality_data_view = air_quality_data_view.mean(numeric_only=True)
 
-    air_quality_data_view = air_quality_data_view.drop(columns=["year"])
+@app.get("/health")
+def health() -> dict:
+    data = get_data()
+    return {
+        "status": "ok",
+        "data_version": data["version"],
+        "data_generation": data["generation"],
+        "latest_data_generation": data_generation(),
+        "chat_model": model_warmer.status(),
+    }
 
-    air_quality_data_view = helpers.rename_air_quality_columns(air_quality_data_view)
 
-    air_quality_data_view = air_quality_data_view.replace(np.nan, None).to_dict(
-        orient="records"
-    )
+@app.get("/metrics")
+def metrics() -> dict:
+    return {
+        "report_cache": report_cache.stats(),
+        "tool_cache": tool_cache.stats(),
+        "chat_scheduler": chat_scheduler.stats(),
+        "chat_cache": chat_cache.stats(),
+    }
 
-    # Sea Water Quality Data View
-    sea_water_quality_data_view = sea_water_quality.copy()
-    sea_water_quality_data_view["date"] = pd.to_datetime(
-        sea_water_quality_data_view["date"], format="%Y-%m"
+
+def _encode_report(
+    data: dict, from_date: date, to_date: date, resolution: Resolution
+) -> bytes:
+    report = _build_report(data, from_date, to_date, resolution)
+
+    if not REPORT_TRUSTED_SERIALIZATION:
+        return Report.model_validate(report).model_dump_json().encode()
+
+    # The story views are embedded as they were validated and encoded at load time,
+    # the rest of the report is built from the cubes in the exact shape of the model.
+    segments = data["segments"]
+    report["air_quality_story_view"] = segments.air_quality_story_view_json
+    report["sea_water_quality_story_view"] = segments.sea_water_quality_story_view_json
+    return serialization.dumps(report)
+
+
+def _build_report(
+    data: dict, from_date: date, to_date: date, resolution: Resolution
+) -> dict:
+    segments = data["segments"]
+    air_quality_cube = data["air_quality_cube"]
+    sea_water_quality_cube = data["sea_water_quality_cube"]
+    sea_water_quality = data["sea_water_quality"]
+
+    # Air Quality Data View
+    air_quality_data_view = helpers.to_avg_records(
+        *air_quality_cube.means(from_date, to_date), air_quality_cube.columns
     )
-    sea_water_quality_data_view = sea_water_quality_data_view[
-        sea_water_quality_data_view["date"].between(
-            from_date, to_date, inclusive="both"
-        )
-    ]
-    water_quality_filtered = sea_water_quality_data_view.copy()
 
-    # If there are no records in the date range, return an empty DataFrame
+    # Sea Water Quality Data View
+    # All the sea water data come from a single location, so the averages are calculated across all locations.
+    sea_water_quality_means = sea_water_quality_cube.overall_means(from_date, to_date)
     sea_water_quality_data_view = (
-        pd.DataFrame()
-        if sea_water_quality_data_view.shape[0] == 0
-        else pd.DataFrame([sea_water_quality_data_view.mean(numeric_only=True)])
+        []
+        if sea_water_quality_means is None
+        else helpers.to_avg_records(
+            sea_water_quality["location"][:1].to_numpy(),
+            sea_water_quality_means[np.newaxis],
+            sea_water_quality_cube.columns,
+        )
     )
-    sea_water_quality_data_view["location"] = sea_water_quality["location"][0]
 
-    sea_water_quality_data_view = helpers.rename_sea_water_quality_columns(
-        sea_water_quality_data_view
+    # Air Quality History (monthly by default)
+    labels, locations, values = air_quality_cube.history(
+        from_date, to_date, "air_quality_index", resolution.value
     )
 
-    sea_water_quality_data_view = sea_water_quality_data_view.replace(
-        np.nan, None
-    ).to_dict(orient="records")
-
-    # Air Quality History (monthly)
-    # Prepare the grouped data
-    aq_grouped = air_quality_filtered_and_grouped.obj
-
-    # Get all months per location
-    aq_grouped["month"] = aq_grouped["date"].dt.strftime("%Y-%m")
-    months_per_location = aq_grouped.groupby("location")["month"].apply(list)
-    counts_per_location = months_per_location.apply(len)
-
-    # Find the location with the most months
-    main_location = counts_per_location.idxmax()
-    labels = sorted(set(months_per_location[main_location]))
-
-    # Build lines for each location
-    lines = []
-    for location in months_per_location.keys():
-        # Map month to air_quality_index
-        loc_df = aq_grouped[aq_grouped["location"] == location]
-        month_to_index = dict(zip(loc_df["month"], loc_df["air_quality_index"]))
-        values = [month_to_index.get(label, None) for label in labels]
-        lines.append(
-            {
-                "location": location,
-                "values": values,
-            }
-        )
-
     air_quality_history = {
         "labels": labels,
-        "lines": lines,
+        "lines": [
+            {"location": location, "values": line}
+            for location, line in zip(locations, helpers.nan_to_none(values))
+        ],
     }
 
     # Water Quality History (yearly, like the original data)
-    sea_water_yearly_avg = (
-        water_quality_filtered.groupby("year")["water_quality_index"]
-        .mean()
-        .reset_index()
-    )
-    sea_water_quality_sorted = sea_water_yearly_avg.sort_values("year")
-    labels = sea_water_quality_sorted["year"].astype(str).tolist()
-    values = sea_water_quality_sorted["water_quality_index"].tolist()
+    years, yearly_means = sea_water_quality_cube.yearly_means(from_date, to_date)
+    index_column = sea_water_quality_cube.columns.index("water_quality_index")
 
     water_quality_history = {
-        "labels": labels,
+        "labels": years.astype(str).tolist(),
         "lines": [
             {
-                "location": water_quality_filtered["location"].iloc[0],
-                "values": values,
+                "location": sea_water_quality["location"][0],
+                "values": yearly_means[:, index_column].tolist(),
             }
         ],
     }
 
     return {
-        "air_quality_story_view": air_quality_story_view,
-        "sea_water_quality_story_view": sea_water_quality_story_view,
+        "air_quality_story_view": segments.air_quality_story_view,
+        "sea_water_quality_story_view": segments.sea_water_quality_story_view,
         "air_quality_data_view": air_quality_data_view,
         "sea_water_quality_data_view": sea_water_quality_data_view,
         "air_quality_history": air_quality_history,
@@ -316,42 +485,171 @@ def report(
     }
 
 
-@app.post("/chat")
-def chat(messages: MessageList = Body()) -> MessageList:
-    full_messages = [{"role": "system", "content": system_prompt}] + messages
+# At temperature 0 the same conversation always gets the same answer, so whole answers are cached
+# per (model, system prompt, messages, data version), optionally in a file so they survive restarts.
+chat_cache = (
+    PersistentLRUCache(
+        CONFIG["CHAT_CACHE_FILE"], int(CONFIG.get("CHAT_CACHE_SIZE", 1024))
+    )
+    if CONFIG.get("CHAT_CACHE_FILE")
+    else LRUCache(int(CONFIG.get("CHAT_CACHE_SIZE", 1024)))
+)
+on_load(lambda _: chat_cache.clear())
+
+
+def _chat_cache_key(data: dict, messages: MessageList) -> str:
+    conversation = [
+        MODEL_NAME,
+        data["system_prompt"],
+        [message.model_dump(mode="json") for message in messages],
+        data["version"],
+    ]
+    return hashlib.sha256(json.dumps(conversation).encode()).hexdigest()
+
+
+@app.post("/chat", responses={503: {"description": "The assistant is too busy"}})
+async def chat(messages: MessageList = Body()) -> MessageList:
+    data = get_data()
+    cached_message = chat_cache.get(_chat_cache_key(data, messages))
+    if cached_message is not None:
+        return messages + [cached_message]
+
+    try:
+        async with chat_scheduler.slot():
+            async for event, payload in _chat_events(data, messages, stream=False):
+                if event == "message":
+                    return messages + [payload]
+    except QueueFull:
+        return _busy_response()
+
+
+@app.post("/chat/stream", responses={503: {"description": "The assistant is too busy"}})
+async def chat_stream(messages: MessageList = Body()) -> StreamingResponse:
+    """
+    Same as `/chat`, but the progress is sent as server-sent events:
+    - `tool_call`: the model called a tool, with its `name` and `arguments`
+    - `tool_result`: a tool call finished, with its `name` and the `content` fed back to the model
+    - `token`: a piece (`content`) of the text the model is generating
+    - `message`: the final message of the assistant (`role` and `content`), it's always the last event
+
+    Tokens generated before a tool call belong to the reasoning of the model, not to the final answer.
+    """
+
+    data = get_data()
+    cached_message = chat_cache.get(_chat_cache_key(data, messages))
+
+    # The slot is taken once the stream starts, but a full queue is rejected before the response starts.
+    if cached_message is None and chat_scheduler.is_full():
+        return _busy_response()
+
+    async def events() -> AsyncIterator[bytes]:
+        if cached_message is not None:
+            yield _server_sent_event("message", cached_message)
+            return
+
+        try:
+            async with chat_scheduler.slot():
+                async for event, payload in _chat_events(data, messages, stream=True):
+                    yield _server_sent_event(event, payload)
+        except QueueFull:
+            yield _server_sent_event("message", BUSY_MESSAGE)
+
+    return StreamingResponse(
+        events(),
+        media_type="text/event-stream",
+        headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"},
+    )
+
+
+BUSY_MESSAGE = {
+    "role": "assistant",
+    "content": "The assistant is too busy right now. Please try again in a bit.",
+}
+
+
+def _server_sent_event(event: str, payload: dict) -> bytes:
+    data = serialization.dumps(payload).decode()
+    return f"event: {event}\ndata: {data}\n\n".encode()
+
+
+def _busy_response() -> JSONResponse:
+    return JSONResponse(
+        status_code=status.HTTP_503_SERVICE_UNAVAILABLE,
+        content={"error": BUSY_MESSAGE["content"]},
+        headers={"Retry-After": str(chat_scheduler.retry_after())},
+    )
+
+
+def _call_tool(function_to_call, arguments: dict, data: dict, deadline: float) -> str:
+    with use_data(data), time_budget(deadline):
+        return function_to_call(**arguments)
+
+
+async def _chat_events(
+    data: dict, messages: MessageList, stream: bool
+) -> AsyncIterator[tuple[str, dict]]:
+    full_messages = [{"role": "system", "content": data["system_prompt"]}] + messages
+
+    # All the tool calls of a request share a time budget, so one bad generation can't hold a slot forever.
+    tools_deadline = time.monotonic() + CHAT_TOOLS_TIME_BUDGET
+    # An answer built on a failed (or timed out) tool call is not cached, the next try may succeed
+    tool_failed = False
 
     # While the model tries to call tools, we will keep calling them until it returns a final message.
     while True:
+        content, tool_calls = "", []
+
         # If the Ollama server is not available, return an error message.
         try:
-            response = ollama_client.chat(
+            response = await ollama_client.chat(
                 MODEL_NAME,
                 messages=full_messages,
                 tools=CHAT_TOOLS,
                 options=CHAT_OPTIONS,
+                keep_alive=CHAT_KEEP_ALIVE,
+                stream=stream,
             )
+            chunks = response if stream else _single(response)
+            async for chunk in chunks:
+                if chunk.message.content:
+                    content += chunk.message.content
+                    if stream:
+                        yield "token", {"content": chunk.message.content}
+
+                tool_calls += getattr(chunk.message, "tool_calls", None) or []
         except ConnectionError:
-            return messages + [
-                {
-                    "role": "assistant",
-                    "content": "The assistant is currently unavailable. Please try again later.",
-                }
-            ]
-
-        tool_calls = getattr(response.message, "tool_calls", None)
+            yield "message", {
+                "role": "assistant",
+                "content": "The assistant is currently unavailable. Please try again later.",
+            }
+            return
 
         if not tool_calls:
-            return messages + [
-                {
-                    "role": "assistant",
-                    "content": response.message.content,
-                }
-            ]
+            message = {"role": "assistant", "content": content}
+            if not tool_failed:
+                # The persistent cache writes to its file, so it's done in the threadpool
+                await run_in_threadpool(
+                    chat_cache.set, _chat_cache_key(data, messages), message
+                )
+            yield "message", message
+            return
 
         for tool in tool_calls:
             function_to_call = available_tools.get(tool.function.name)
             if function_to_call:
-                tool_output = function_to_call(**tool.function.arguments)
+                yield "tool_call", {
+                    "name": tool.function.name,
+                    "arguments": tool.function.arguments,
+                }
+                # The queries are blocking, so they run in the threadpool and don't stall the event loop.
+                tool_output = await run_in_threadpool(
+                    _call_tool,
+                    function_to_call,
+                    tool.function.arguments,
+                    data,
+                    tools_deadline,
+                )
+                tool_failed = tool_failed or str(tool_output).startswith(TOOL_ERROR)
                 full_messages.append(
                     {
                         "role": "assistant",
@@ -366,3 +664,70 @@ def chat(messages: MessageList = Body()) -> MessageList:
                         "content": str(tool_output),
                     }
                 )
+                yield "tool_result", {
+                    "name": tool.function.name,
+                    "content": str(tool_output),
+                }
+
+
+async def _single(response: ollama.ChatResponse) -> AsyncIterator[ollama.ChatResponse]:
+    yield response
+
+
+# Only one reload runs at a time, the data keep being served from the current snapshot while it runs
+_reload_lock = asyncio.Lock()
+
+
+async def _reload_data() -> dict:
+    async with _reload_lock:
+        data = await run_in_threadpool(load_data, DATA_SHARED)
+        print("Data reloaded, version:", data["version"])
+        return data
+
+
+async def _watch_data() -> None:
+    while True:
+        await asyncio.sleep(DATA_WATCH_INTERVAL)
+        latest_generation = data_generation()
+        if latest_generation is None or latest_generation == get_data()["generation"]:
+            continue
+
+        try:
+            await _reload_data()
+        except Exception as e:
+            print("Data reload failed:", e)
+
+
+@app.post(
+    "/admin/reload",
+    responses={
+        403: {"description": "Missing or wrong admin token"},
+        500: {"description": "The data could not be loaded"},
+    },
+)
+async def reload_data(request: Request) -> dict:
+    """
+    Reload the data (and everything derived from them) without a restart, with `Authorization: Bearer <ADMIN_TOKEN>`.
+    The new snapshot is built in the background and swapped in at once, requests that are already running
+    finish on the previous one. Only this worker is reloaded, the other ones follow through `DATA_WATCH_INTERVAL`.
+    """
+
+    authorization = request.headers.get("authorization", "")
+    if not ADMIN_TOKEN or not secrets.compare_digest(
+        authorization.encode(), f"Bearer {ADMIN_TOKEN}".encode()
+    ):
+        return JSONResponse(
+            status_code=status.HTTP_403_FORBIDDEN,
+            content={"error": "Missing or wrong admin token"},
+        )
+
+    try:
+        data = await _reload_data()
+    except Exception as e:
+        print("Data reload failed:", e)
+        return JSONResponse(
+            status_code=status.HTTP_500_INTERNAL_SERVER_ERROR,
+            content={"error": f"The data could not be loaded: {e}"},
+        )
+
+    return {"data_version": data["version"], "data_generation": data["generation"]}
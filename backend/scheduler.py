@@ -0,0 +1,144 @@
+"""
+This module holds the scheduler that bounds the concurrent requests to the LLM.
+
+A single model server can only run a few generations at a time efficiently, when more requests hit it
+at once every user's latency goes up. The scheduler lets a fixed number of requests talk to the model
+and keeps the rest in a bounded FIFO queue. When the queue is full, requests are rejected right away
+(the API answers with 503 and a Retry-After header) instead of piling up.
+"""
+
+from collections import deque
+from contextlib import asynccontextmanager
+from typing import AsyncIterator
+import asyncio
+import math
+import time
+
+
+class QueueFull(Exception):
+    """
+    Raised when a request can't even wait for a slot, because the queue is full.
+    """
+
+
+class LLMScheduler:
+    """
+    A FIFO scheduler with bounded concurrency and a bounded queue, for a single event loop.
+
+    Attributes:
+        concurrency (int): The maximum number of requests that hold a slot at the same time.
+        max_queue (int): The maximum number of requests that wait for a slot.
+    """
+
+    def __init__(self, concurrency: int, max_queue: int):
+        self.concurrency = concurrency
+        self.max_queue = max_queue
+        self._active = 0
+        self._waiters: deque[asyncio.Future] = deque()
+
+        self._admitted = 0
+        self._rejected = 0
+        self._completed = 0
+        self._total_wait = 0.0
+        self._max_wait = 0.0
+        self._total_service = 0.0
+
+    def is_full(self) -> bool:
+        """
+        Check whether a new request would be rejected.
+
+        Returns:
+            bool: Whether all the slots are taken and the queue is full.
+        """
+
+        return self._active >= self.concurrency and len(self._waiters) >= self.max_queue
+
+    def retry_after(self) -> int:
+        """
+        Estimate the number of seconds until a rejected request is likely to be admitted,
+        based on the average time a request holds a slot.
+
+        Returns:
+            int: The estimated number of seconds, at least 1.
+        """
+
+        if not self._completed:
+            return 1
+
+        average_service = self._total_service / self._completed
+        return max(
+            1, math.ceil(average_service * (len(self._waiters) + 1) / self.concurrency)
+        )
+
+    @asynccontextmanager
+    async def slot(self) -> AsyncIterator[None]:
+        """
+        Hold a slot for the duration of the block, waiting in the queue (FIFO) if all slots are taken.
+
+        Raises:
+            QueueFull: If all the slots are taken and the queue is full.
+        """
+
+        if self.is_full():
+            self._rejected += 1
+            raise QueueFull()
+
+        queued_at = time.monotonic()
+        if self._active < self.concurrency and not self._waiters:
+            self._active += 1
+        else:
+            waiter = asyncio.get_running_loop().create_future()
+            self._waiters.append(waiter)
+            try:
+                # The slot is handed over by the request that releases it, `_active` stays the same.
+                await waiter
+            except asyncio.CancelledError:
+                # Cancelling the task cancels the future too, only a future with a result was handed a slot
+                if waiter.done() and not waiter.cancelled():
+                    self._release()
+                else:
+                    self._waiters.remove(waiter)
+                raise
+
+        started_at = time.monotonic()
+        wait = started_at - queued_at
+        self._admitted += 1
+        self._total_wait += wait
+        self._max_wait = max(self._max_wait, wait)
+
+        try:
+            yield
+        finally:
+            self._completed += 1
+            self._total_service += time.monotonic() - started_at
+            self._release()
+
+    def _release(self) -> None:
+        while self._waiters:
+            waiter = self._waiters.popleft()
+            if not waiter.done():
+                waiter.set_result(None)
+                return
+
+        self._active -= 1
+
+    def stats(self) -> dict[str, int | float]:
+        """
+        Get the queue depth, the wait times and the counters of the scheduler.
+
+        Returns:
+            dict[str, int | float]: The statistics of the scheduler.
+        """
+
+        return {
+            "concurrency": self.concurrency,
+            "max_queue": self.max_queue,
+            "active": self._active,
+            "queued": len(self._waiters),
+            "admitted": self._admitted,
+            "rejected": self._rejected,
+            "average_wait": (
+                self._total_wait / self._admitted if self._admitted else 0.0
+            ),
+            "max_wait": self._max_wait,
+        }
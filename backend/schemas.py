@@ -23,11 +23,31 @@ class LocationName(str, Enum):
     THERMAIKOS_PORT = "Thermaikos Port"
 
 
+class LocationDetail(str, Enum):
+    LOW = "low"
+    MEDIUM = "medium"
+    FULL = "full"
+
+
 class MessageRole(str, Enum):
     USER = "user"
     ASSISTANT = "assistant"
 
 
+class Resolution(str, Enum):
+    MONTH = "month"
+    QUARTER = "quarter"
+    YEAR = "year"
+
+
+class TimeSeriesResolution(str, Enum):
+    DAY = "day"
+    WEEK = "week"
+    MONTH = "month"
+    QUARTER = "quarter"
+    YEAR = "year"
+
+
 class DateRange(BaseModel):
     from_date: date
     to_date: date
@@ -103,6 +123,23 @@ class Report(BaseModel):
     water_quality_history: WaterQualityHistory
 
 
+class TimeSeriesPoint(BaseModel):
+    period: str
+    start: date
+    mean: float
+    min: float
+    max: float
+    count: int  # the number of values (e.g. hourly measurements or monthly means) of the period
+
+
+class TimeSeries(BaseModel):
+    location: LocationName
+    metric: str
+    resolution: TimeSeriesResolution
+    downsampled: bool
+    points: list[TimeSeriesPoint]
+
+
 class Message(BaseModel):
     role: MessageRole
     content: str
@@ -0,0 +1,81 @@
+"""
+This module holds the "static" segments of the report, the parts that don't depend on the requested date range.
+
+The story views and the acceptable date range only change when the data change, so they are computed once,
+right when `load_data` runs, and are kept as ready to return (JSON compatible) payloads.
+The story views are also validated and encoded once, so the fast serialization path can embed them as they are.
+Every `/report` call then only does the range dependent work.
+"""
+
+from datetime import date
+from typing import Callable
+
+import numpy as np
+import pandas as pd
+
+from .data import on_load
+from .schemas import ReportStoryViewAirQualityPeriod, ReportStoryViewSeaWaterPeriod
+from .serialization import validated_fragment
+from . import helpers
+
+
+class StaticReportSegments:
+    """
+    The date independent parts of the report, computed from a single load of the data.
+
+    Attributes:
+        date_range (dict[str, date]): The acceptable date range of the report.
+        air_quality_story_view (list[dict]): The air quality averages per location and period.
+        sea_water_quality_story_view (list[dict]): The sea water quality averages per location and period.
+        air_quality_story_view_json (orjson.Fragment): The validated JSON encoding of the air quality story view.
+        sea_water_quality_story_view_json (orjson.Fragment): The validated JSON encoding of the sea water quality story view.
+    """
+
+    def __init__(self, air_quality: pd.DataFrame, sea_water_quality: pd.DataFrame):
+        self.date_range = _date_range(air_quality, sea_water_quality)
+        self.air_quality_story_view = _story_view(
+            air_quality, helpers.rename_air_quality_columns
+        )
+        self.sea_water_quality_story_view = _story_view(
+            sea_water_quality, helpers.rename_sea_water_quality_columns
+        )
+        self.air_quality_story_view_json = validated_fragment(
+            list[ReportStoryViewAirQualityPeriod], self.air_quality_story_view
+        )
+        self.sea_water_quality_story_view_json = validated_fragment(
+            list[ReportStoryViewSeaWaterPeriod], self.sea_water_quality_story_view
+        )
+
+
+@on_load
+def _rebuild(data: dict) -> None:
+    data["segments"] = StaticReportSegments(
+        data["air_quality"], data["sea_water_quality"]
+    )
+
+
+def _date_range(
+    air_quality: pd.DataFrame, sea_water_quality: pd.DataFrame
+) -> dict[str, date]:
+    min_air_quality_date = pd.to_datetime(air_quality["date"].min())
+    min_sea_water_quality_date = pd.to_datetime(sea_water_quality["date"].min())
+    max_air_quality_date = pd.to_datetime(air_quality["date"].max())
+    max_sea_water_quality_date = pd.to_datetime(sea_water_quality["date"].max())
+
+    return {
+        "from_date": min(min_air_quality_date, min_sea_water_quality_date).date(),
+        "to_date": max(max_air_quality_date, max_sea_water_quality_date).date(),
+    }
+
+
+def _story_view(
+    df: pd.DataFrame, rename: Callable[[pd.DataFrame], pd.DataFrame]
+) -> list[dict]:
+    story_view = df.copy()
+    story_view["period"] = story_view["date"]
+
+    story_view = story_view.groupby(["location", "period"], as_index=False).mean(
+        numeric_only=True
+    )
+
+    return rename(story_view).replace(np.nan, None).to_dict(orient="records")
@@ -0,0 +1,69 @@
+"""
+This module holds the fast JSON serialization path of the API.
+
+By default, FastAPI validates a returned payload against its response model and then encodes it with the standard
+`json` module. For payloads we build ourselves from precomputed, already validated data, both steps can be skipped
+and the payload can be encoded directly with orjson, which handles numpy arrays natively and writes NaN as null.
+The endpoints still declare their response models, so the OpenAPI schema stays the same.
+
+Bodies that are served over and over (e.g. the locations) can also be compressed once, at the highest levels,
+so the requests only pick the variant the client accepts.
+"""
+
+from typing import Any
+import gzip
+
+from pydantic import TypeAdapter
+import brotli
+import orjson
+
+
+def dumps(obj: Any) -> bytes:
+    """
+    Encode an object to JSON bytes, numpy arrays and `orjson.Fragment`s (pre-encoded JSON) are supported.
+
+    Args:
+        obj (Any): The object to encode.
+
+    Returns:
+        bytes: The JSON representation of the object, with NaN values as null.
+    """
+
+    return orjson.dumps(obj, option=orjson.OPT_SERIALIZE_NUMPY)
+
+
+def validated_fragment(model: Any, obj: Any) -> orjson.Fragment:
+    """
+    Validate an object against a model (or any type pydantic understands) once, and keep its JSON encoding,
+    so it can be embedded into larger payloads without being validated or encoded again.
+
+    Args:
+        model (Any): The model or type to validate against, e.g. `list[AirQuality]`.
+        obj (Any): The object to validate.
+
+    Returns:
+        orjson.Fragment: The validated and encoded object.
+    """
+
+    adapter = TypeAdapter(model)
+    return orjson.Fragment(adapter.dump_json(adapter.validate_python(obj)))
+
+
+def precompress(body: bytes) -> dict[str, bytes]:
+    """
+    Compress a body with every supported content coding, with the slowest but smallest settings,
+    since it's meant to be done once and served many times.
+
+    Args:
+        body (bytes): The body to compress.
+
+    Returns:
+        dict[str, bytes]: The body of every content coding (`br`, `gzip` and `identity`), in the order of preference.
+    """
+
+    return {
+        "br": brotli.compress(body, mode=brotli.MODE_TEXT, quality=11),
+        # A fixed modification time, so the same body is always compressed to the same bytes
+        "gzip": gzip.compress(body, compresslevel=9, mtime=0),
+        "identity": body,
+    }
@@ -0,0 +1,297 @@
+"""
+This module holds the SQL engine the chat tools run their queries on.
+
+Instead of creating a fresh SQLite database and inserting a whole table on every tool call (like `pandasql` does),
+the tables are written once per generation of the columnar copy of the data into a SQLite file next to it,
+which every process opens read-only and memory-maps, so the pages are shared by all of them.
+When the data don't come from a columnar copy, they are loaded into a named, in-memory database with shared cache.
+Every thread gets its own read-only connection to the database, with SQLite's prepared statement cache.
+On a data reload a new engine is built next to the old one and swapped in together with the new data snapshot,
+so queries that are already running finish on the old tables.
+
+The queries are written by the LLM, so they run behind some guardrails: only SELECT/WITH statements are accepted,
+a query can be limited to reading some of the tables (enforced by a SQLite authorizer, so every tool only sees its own),
+every query has a wall-clock timeout (enforced by a SQLite progress handler), results are capped to a number of rows,
+and all the queries of a single request share a total time budget (see `time_budget`).
+"""
+
+from contextlib import contextmanager
+from contextvars import ContextVar
+from itertools import count
+from pathlib import Path
+from typing import Iterable, Iterator
+import re
+import sqlite3
+import threading
+import time
+
+import pandas as pd
+
+from .data import generation_file, on_load
+
+# The columns every table is indexed on, when it has them
+INDEXED_COLUMNS = ["location", "date", "year"]
+
+# How many SQLite virtual machine instructions run between two timeout checks
+PROGRESS_HANDLER_STEPS = 10_000
+# Bump it when the way the tables are written changes, so the database files of the existing copies are not used
+DATABASE_FILE = "tables-1.sqlite3"
+# How many bytes of the database file every connection memory-maps, more than the whole file
+MMAP_SIZE = 256 * 1024 * 1024
+
+_engine_ids = count()
+_deadline: ContextVar[float | None] = ContextVar("deadline", default=None)
+
+_COMMENTS = re.compile(r"--[^\n]*|/\*.*?\*/", re.DOTALL)
+_ALLOWED_STATEMENT = re.compile(r"^[\s(]*(select|with)\b", re.IGNORECASE)
+_TOKENS = re.compile(
+    r"""'(?:[^']|'')*'|"(?:[^"]|"")*"|--[^\n]*|/\*.*?\*/|\d+(?:\.\d*)?|\w+|\s+|.""",
+    re.DOTALL,
+)
+_LITERAL = re.compile(r"'.*'|\d+(?:\.\d*)?$", re.DOTALL)
+
+# The keywords whose case is normalized, identifiers and functions are left as they are
+# because their case shows up in the column names of the results.
+KEYWORDS = set("""
+    all and as asc between by case cross desc distinct else end escape except exists from glob group
+    having in inner intersect is join left like limit not null offset on or order outer select then
+    union using when where with
+    """.split())
+
+
+class QueryError(Exception):
+    """
+    Raised when a query is rejected or stopped by the guardrails.
+    """
+
+
+@contextmanager
+def time_budget(deadline: float) -> Iterator[None]:
+    """
+    Make the queries that run inside the block (in the same context) stop at a deadline.
+    Using the same deadline for all the tool calls of a single chat request gives them a total time budget.
+
+    Args:
+        deadline (float): The `time.monotonic()` time the queries must finish by.
+    """
+
+    token = _deadline.set(deadline)
+    try:
+        yield
+    finally:
+        _deadline.reset(token)
+
+
+def check_query(sql_query: str) -> None:
+    """
+    Make sure a query is a SELECT (or WITH) statement.
+    Running more than one statement at a time is already refused by `sqlite3`.
+
+    Args:
+        sql_query (str): The SQL query to check.
+
+    Raises:
+        QueryError: If the query is anything else.
+    """
+
+    if not _ALLOWED_STATEMENT.match(_COMMENTS.sub(" ", sql_query)):
+        raise QueryError("Only SELECT (or WITH) queries are allowed.")
+
+
+def normalize_query(sql_query: str) -> str:
+    """
+    Normalize a query so that queries that only differ in whitespace, comments, keyword case,
+    trailing semicolons or the order of the literals of an IN list map to the same string.
+    The normalized query is only meant to be used as a cache key, it's not meant to be executed.
+
+    Args:
+        sql_query (str): The SQL query to normalize.
+
+    Returns:
+        str: The normalized query.
+    """
+
+    tokens = [
+        token.upper() if token.lower() in KEYWORDS else token
+        for token in _TOKENS.findall(sql_query)
+        if not token.isspace() and not token.startswith(("--", "/*"))
+    ]
+    while tokens and tokens[-1] == ";":
+        tokens.pop()
+
+    # Sort the literals of IN lists, e.g. IN ('b', 'a') -> IN ('a', 'b')
+    for i, token in enumerate(tokens):
+        if token != "IN" or tokens[i + 1 : i + 2] != ["("]:
+            continue
+
+        end = tokens.index(")", i) if ")" in tokens[i:] else i
+        items = tokens[i + 2 : end]
+        literals = items[::2]
+        if all(map(_LITERAL.match, literals)) and set(items[1::2]) <= {","}:
+            items[::2] = sorted(literals)
+            tokens[i + 2 : end] = items
+
+    return " ".join(tokens)
+
+
+class SQLEngine:
+    """
+    A read-only SQLite database with the data tables, shared by per thread connections.
+
+    Attributes:
+        uri (str): The URI of the database file, or of the in-memory database.
+        tables (list[str]): The names of the loaded tables.
+    """
+
+    def __init__(self, tables: dict[str, pd.DataFrame], path: str | None = None):
+        """
+        Args:
+            tables (dict[str, pd.DataFrame]): The tables, by name.
+            path (str | None): The database file the tables were written to with `write_database`,
+                None to load them into an in-memory database.
+        """
+
+        self.tables = list(tables)
+        self._local = threading.local()
+        self._owner = None
+        if path is not None:
+            # Immutable, so SQLite doesn't lock the file or check it for changes
+            self.uri = f"{Path(path).as_uri()}?mode=ro&immutable=1"
+            return
+
+        self.uri = f"file:airwave-{next(_engine_ids)}?mode=memory&cache=shared"
+        # The in-memory database lives as long as at least one connection to it is open,
+        # so the connection that creates it is kept open for the whole life of the engine.
+        self._owner = sqlite3.connect(self.uri, uri=True, check_same_thread=False)
+        _write_tables(self._owner, tables)
+
+    def connection(self) -> sqlite3.Connection:
+        """
+        Get the read-only connection of the current thread, it's created on first use.
+
+        Returns:
+            sqlite3.Connection: The connection to the in-memory database.
+        """
+
+        connection = getattr(self._local, "connection", None)
+        if connection is None:
+            connection = sqlite3.connect(self.uri, uri=True, cached_statements=256)
+            connection.execute("PRAGMA query_only = ON")
+            connection.execute(f"PRAGMA mmap_size = {MMAP_SIZE}")
+            self._local.connection = connection
+
+        return connection
+
+    def query(
+        self,
+        sql_query: str,
+        timeout: float,
+        max_rows: int,
+        tables: Iterable[str] | None = None,
+    ) -> tuple[pd.DataFrame, bool]:
+        """
+        Run a query on the database behind the guardrails.
+
+        Args:
+            sql_query (str): The SQL query to run.
+            timeout (float): The maximum number of seconds the query may run for.
+            max_rows (int): The maximum number of rows to return.
+            tables (Iterable[str] | None): The only tables the query may read, None means all of them.
+
+        Returns:
+            tuple[pd.DataFrame, bool]: The (first `max_rows` rows of the) result and whether there were more rows.
+
+        Raises:
+            QueryError: If the query is not allowed, reads another table, times out or the time budget is exhausted.
+        """
+
+        check_query(sql_query)
+
+        deadline = time.monotonic() + timeout
+        budget_deadline = _deadline.get()
+        if budget_deadline is not None:
+            if budget_deadline <= time.monotonic():
+                raise QueryError(
+                    "The time budget for queries of this request is exhausted."
+                )
+            deadline = min(deadline, budget_deadline)
+
+        connection = self.connection()
+        connection.set_progress_handler(
+            lambda: time.monotonic() > deadline, PROGRESS_HANDLER_STEPS
+        )
+        denied = []
+        if tables is not None:
+            allowed = set(tables)
+
+            def authorize(action: int, table: str | None, *_) -> int:
+                # Changing the authorizer expires the prepared statements, so cached ones are authorized again
+                if action == sqlite3.SQLITE_READ and table not in allowed:
+                    denied.append(table)
+                    return sqlite3.SQLITE_DENY
+                return sqlite3.SQLITE_OK
+
+            connection.set_authorizer(authorize)
+
+        try:
+            cursor = connection.execute(sql_query)
+            # A single extra row tells whether the result was cut, the rest of the rows are never computed
+            rows = cursor.fetchmany(max_rows + 1)
+            truncated = len(rows) > max_rows
+            rows = rows[:max_rows]
+            columns = [column[0] for column in cursor.description or []]
+        except sqlite3.DatabaseError as e:
+            if denied:
+                raise QueryError(
+                    f"The query can only read the {', '.join(sorted(allowed))} table(s), not {denied[0]}."
+                ) from e
+            if time.monotonic() > deadline:
+                raise QueryError("The query took more than the allowed time.") from e
+            raise
+        finally:
+            connection.set_progress_handler(None, 0)
+            connection.set_authorizer(None)
+
+        return pd.DataFrame.from_records(rows, columns=columns), truncated
+
+
+def write_database(tables: dict[str, pd.DataFrame], path: str) -> None:
+    """
+    Write the tables (and their indexes) into a new SQLite database file, for `SQLEngine` to open.
+
+    Args:
+        tables (dict[str, pd.DataFrame]): The tables, by name.
+        path (str): The path of the database file.
+    """
+
+    connection = sqlite3.connect(path)
+    try:
+        _write_tables(connection, tables)
+    finally:
+        connection.close()
+
+
+def _write_tables(
+    connection: sqlite3.Connection, tables: dict[str, pd.DataFrame]
+) -> None:
+    for name, df in tables.items():
+        df.to_sql(name, connection, index=False)
+        for column in INDEXED_COLUMNS:
+            if column in df.columns:
+                connection.execute(
+                    f'CREATE INDEX "{name}_{column}" ON "{name}" ("{column}")'
+                )
+
+    connection.commit()
+
+
+@on_load
+def _rebuild(data: dict) -> None:
+    tables = {
+        "air_quality": data["air_quality"],
+        "sea_water_quality": data["sea_water_quality"],
+    }
+    path = generation_file(
+        data, DATABASE_FILE, lambda path: write_database(tables, path)
+    )
+    data["engine"] = SQLEngine(tables, path)
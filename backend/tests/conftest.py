@@ -0,0 +1,86 @@
+from typing import Any
+import asyncio
+
+from fastapi.testclient import TestClient
+from ollama import ChatResponse, Message
+import pytest
+
+
+class FakeOllamaClient:
+    """
+    An Ollama client that answers like a model that first calls some tools, one per request, and then answers.
+
+    Attributes:
+        requests (list[dict]): The arguments of every chat request.
+        error (Exception | None): The error every chat request raises, if any.
+    """
+
+    def __init__(
+        self,
+        tool_calls: list[tuple[str, str]] = (),
+        answer: str = "The answer.",
+        delay: float = 0.0,
+        error: Exception | None = None,
+    ):
+        self.requests: list[dict] = []
+        self._tool_calls = list(tool_calls)
+        self._answer = answer
+        self._delay = delay
+        self.error = error
+
+    async def chat(
+        self, model: str, messages: list, stream: bool = False, **kwargs: Any
+    ) -> Any:
+        self.requests.append({"model": model, "messages": messages, **kwargs})
+        await asyncio.sleep(self._delay)
+        if self.error is not None:
+            raise self.error
+
+        tool_results = sum(
+            1
+            for message in messages
+            if isinstance(message, dict) and message["role"] == "tool"
+        )
+        if tool_results < len(self._tool_calls):
+            name, sql_query = self._tool_calls[tool_results]
+            tool_call = Message.ToolCall(
+                function=Message.ToolCall.Function(
+                    name=name, arguments={"sql_query": sql_query}
+                )
+            )
+            message = Message(role="assistant", content="", tool_calls=[tool_call])
+        else:
+            message = Message(role="assistant", content=self._answer)
+
+        response = ChatResponse(model=model, message=message, done=True)
+        if not stream:
+            return response
+
+        async def chunks():
+            yield response
+
+        return chunks()
+
+
+@pytest.fixture
+def main():
+    from backend import main
+
+    main.chat_cache.clear()
+    main.tool_cache.clear()
+    return main
+
+
+@pytest.fixture
+def client(main) -> TestClient:
+    return TestClient(main.app)
+
+
+@pytest.fixture
+def fake_ollama(main, monkeypatch):
+    def install(**kwargs: Any) -> FakeOllamaClient:
+        fake = FakeOllamaClient(**kwargs)
+        monkeypatch.setattr(main, "ollama_client", fake)
+        return fake
+
+    return install
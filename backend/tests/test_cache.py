@@ -0,0 +1,71 @@
+"""
+Checks the persistent LRU cache and the chat answer caching.
+"""
+
+import json
+
+from backend.cache import PersistentLRUCache
+
+MESSAGES = [{"role": "user", "content": "How many rows?"}]
+
+
+def test_persistent_cache_survives_restarts(tmp_path):
+    path = str(tmp_path / "cache.jsonl")
+    cache = PersistentLRUCache(path, maxsize=4)
+    cache.set("a", {"content": 1})
+    cache.set("b", {"content": 2})
+
+    assert PersistentLRUCache(path, maxsize=4).get("a") == {"content": 1}
+
+
+def test_persistent_cache_skips_unreadable_lines(tmp_path):
+    path = tmp_path / "cache.jsonl"
+    path.write_text(
+        json.dumps(["a", 1]) + "\n" + '["b", ' + "\n" + json.dumps(["c", 3]) + "\n"
+    )
+
+    cache = PersistentLRUCache(str(path), maxsize=4)
+
+    assert cache.get("a") == 1 and cache.get("c") == 3
+    # The file is compacted to the readable entries
+    assert path.read_text().splitlines() == [json.dumps(["a", 1]), json.dumps(["c", 3])]
+
+
+def test_persistent_cache_compaction_keeps_other_processes_entries(tmp_path):
+    path = str(tmp_path / "cache.jsonl")
+    first = PersistentLRUCache(path, maxsize=3)
+    second = PersistentLRUCache(path, maxsize=3)
+    second.set("other", 0)
+    # Enough appends to compact the file from the first cache
+    for i in range(7):
+        first.set(f"key-{i}", i)
+
+    entries = dict(map(json.loads, open(path)))
+    assert len(entries) <= 3 * 2
+    assert PersistentLRUCache(path, maxsize=3).get("key-6") == 6
+
+
+def test_answer_is_cached(client, fake_ollama):
+    fake = fake_ollama(
+        tool_calls=[("query_air_quality_data", "SELECT count(*) FROM air_quality")]
+    )
+
+    first = client.post("/chat", json=MESSAGES).json()
+    requests = len(fake.requests)
+    second = client.post("/chat", json=MESSAGES).json()
+
+    assert first == second
+    assert first[-1]["content"] == "The answer."
+    assert len(fake.requests) == requests == 2
+
+
+def test_answer_after_failed_tool_is_not_cached(client, fake_ollama):
+    fake = fake_ollama(
+        tool_calls=[("query_air_quality_data", "SELECT * FROM sea_water_quality")]
+    )
+
+    client.post("/chat", json=MESSAGES)
+    client.post("/chat", json=MESSAGES)
+
+    # The tool call failed (it's scoped to the air quality table), so the second request asked the model again
+    assert len(fake.requests) == 4
@@ -0,0 +1,52 @@
+"""
+Checks the formatting of the chat tool results.
+"""
+
+import pandas as pd
+import pytest
+
+from backend.data import DATA_DIR
+from backend.formatting import estimate_tokens, format_result
+
+# The default token budget of the air quality tool
+TOKEN_BUDGET = 1500
+
+
+@pytest.fixture
+def air_quality() -> pd.DataFrame:
+    return pd.read_csv(f"{DATA_DIR}/air_quality.tsv", sep="\t")
+
+
+def test_csv_shorter_than_table(air_quality: pd.DataFrame):
+    df = air_quality[["date", "co", "no2", "o3", "air_quality_index"]].head(36)
+
+    table = format_result(df, False, 1_000_000)
+    csv = format_result(df, False, estimate_tokens(table) - 1)
+
+    assert csv.startswith("date,co,no2,o3,air_quality_index\n")
+    assert len(csv) < len(table)
+
+
+def test_csv_keeps_significant_digits():
+    df = pd.DataFrame({"co": [347.8517168503584, 0.000123456789], "year": [2017, 2018]})
+
+    csv = format_result(df, False, 13)
+
+    assert csv.startswith("co,year\n347.852,2017\n0.000123457,2018")
+
+
+def test_typical_result_fits_without_truncation(air_quality: pd.DataFrame):
+    df = air_quality[["date", "co", "no2", "o3"]].head(120)
+
+    text = format_result(df, False, TOKEN_BUDGET)
+
+    assert estimate_tokens(text) <= TOKEN_BUDGET
+    assert text.startswith("date,co,no2,o3\n")
+    assert len(text.splitlines()) == 121
+    assert "..." not in text
+
+
+def test_truncated_result_is_noted(air_quality: pd.DataFrame):
+    df = air_quality[["date", "co"]].head(10)
+
+    assert format_result(df, True, TOKEN_BUDGET).endswith("... more rows truncated")
@@ -0,0 +1,81 @@
+"""
+Checks the simplification of the location polygons for the lower levels of detail.
+"""
+
+from itertools import combinations
+
+import numpy as np
+
+from backend.geometry import simplify_multi_polygons
+
+
+def _segments(ring: list[list[float]]) -> list[tuple[tuple, tuple]]:
+    return [(tuple(a), tuple(b)) for a, b in zip(ring, ring[1:])]
+
+
+def _cross(first: tuple[tuple, tuple], second: tuple[tuple, tuple]) -> bool:
+    # Whether two segments cross at a point that is not an endpoint of both
+    def orientation(a, b, c):
+        return np.sign((b[0] - a[0]) * (c[1] - a[1]) - (b[1] - a[1]) * (c[0] - a[0]))
+
+    (a, b), (c, d) = first, second
+    if {a, b} & {c, d}:
+        return False
+
+    return (
+        orientation(a, b, c) * orientation(a, b, d) < 0
+        and orientation(c, d, a) * orientation(c, d, b) < 0
+    )
+
+
+def _crossings(multi_polygons: list[list]) -> int:
+    segments = [
+        segment
+        for polygons in multi_polygons
+        for polygon in polygons
+        for ring in polygon
+        for segment in _segments(ring)
+    ]
+    return sum(_cross(first, second) for first, second in combinations(segments, 2))
+
+
+def _area(ring: list[list[float]]) -> float:
+    x, y = np.array(ring).T
+    return float(x @ np.roll(y, -1) - y @ np.roll(x, -1)) / 2
+
+
+def test_adjacent_polygons_keep_their_shared_border():
+    # Two squares that share a wiggly border, whose wiggles are smaller than the tolerance
+    border = [[1 + 0.01 * (-1) ** i, i / 10] for i in range(11)]
+    left = [[0, 0]] + border + [[0, 1], [0, 0]]
+    right = border[::-1] + [[2, 0], [2, 1], border[-1]]
+
+    low_left, low_right = simplify_multi_polygons([[[left]], [[right]]], 0.05)
+
+    left_border = {tuple(point) for point in low_left[0][0] if 0.9 < point[0] < 1.1}
+    right_border = {tuple(point) for point in low_right[0][0] if 0.9 < point[0] < 1.1}
+    assert left_border == right_border
+    assert len(low_left[0][0]) < len(left)
+    assert _crossings([low_left, low_right]) == 0
+
+
+def test_simplified_arcs_dont_cross_other_rings():
+    # Simplifying the notched border on its own would cut straight through the small island next to it
+    notched = [[0, 0], [4.6, 0], [5, -3], [5.4, 0], [10, 0], [10, 5], [0, 5], [0, 0]]
+    island = [[2, -1], [3, -1], [3, -2.5], [2, -1]]
+
+    simplified = simplify_multi_polygons([[[notched]], [[island]]], 2.5)
+
+    assert _crossings(simplified) == 0
+    assert simplified[1] == [[island]]
+
+
+def test_small_rings_dont_collapse():
+    square = [[0, 0], [10, 0], [10, 10], [0, 10], [0, 0]]
+    hole = [[4, 4], [4, 4.2], [4.1, 4.3], [4.2, 4.2], [4.2, 4], [4, 4]]
+
+    ((exterior, simplified_hole),) = simplify_multi_polygons([[[square, hole]]], 1)[0]
+
+    assert exterior == square
+    assert len(simplified_hole) >= 4
+    assert np.sign(_area(simplified_hole)) == np.sign(_area(hole)) != 0
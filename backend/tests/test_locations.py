@@ -0,0 +1,42 @@
+"""
+Checks the `/locations` bodies that are encoded and compressed once per generation of the columnar copy.
+"""
+
+import orjson
+import pytest
+
+
+@pytest.mark.parametrize("detail", ["low", "medium", "full"])
+def test_every_encoding_has_the_same_locations(client, detail: str):
+    bodies = {}
+    for encoding in ["br", "gzip", "identity"]:
+        response = client.get(
+            "/locations",
+            params={"detail": detail},
+            headers={"accept-encoding": encoding},
+        )
+        assert response.status_code == 200
+        assert response.headers.get("content-encoding", "identity") == encoding
+        # Decoded by the test client
+        bodies[encoding] = response.content
+
+    assert bodies["br"] == bodies["gzip"] == bodies["identity"]
+    locations = orjson.loads(bodies["identity"])
+    assert len(locations) == 15
+    assert all(location["multi_polygons"] for location in locations)
+
+
+def test_bodies_are_kept_with_the_generation(main):
+    data = main.get_data()
+    assert data["generation"] is not None
+    # Memory mapped from the files of the generation, not encoded by every process
+    assert isinstance(data["location_bodies"]["full"]["br"], memoryview)
+    assert "multi_polygons" not in data["location"].columns
+
+
+def test_not_modified(client):
+    etag = client.get("/locations").headers["etag"]
+
+    response = client.get("/locations", headers={"if-none-match": etag})
+
+    assert response.status_code == 304
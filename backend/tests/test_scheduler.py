@@ -0,0 +1,156 @@
+"""
+Checks the scheduler that bounds the concurrent requests to the LLM, on its own and behind `/chat`.
+"""
+
+import asyncio
+
+import httpx
+import pytest
+
+from backend import scheduler
+from backend.scheduler import LLMScheduler, QueueFull
+
+
+def test_slots_are_given_in_fifo_order():
+    llm_scheduler = LLMScheduler(concurrency=1, max_queue=3)
+    order = []
+
+    async def request(name: str, release: asyncio.Event):
+        async with llm_scheduler.slot():
+            order.append(name)
+            await release.wait()
+
+    async def main():
+        releases = {name: asyncio.Event() for name in ["a", "b", "c", "d"]}
+        tasks = []
+        for name, release in releases.items():
+            tasks.append(asyncio.create_task(request(name, release)))
+            await asyncio.sleep(0)
+
+        assert llm_scheduler.stats()["active"] == 1
+        assert llm_scheduler.stats()["queued"] == 3
+        # Releasing the slots out of order still hands them over in the order of arrival
+        for name in ["d", "c", "b", "a"]:
+            releases[name].set()
+        await asyncio.gather(*tasks)
+
+    asyncio.run(main())
+
+    assert order == ["a", "b", "c", "d"]
+    assert llm_scheduler.stats()["active"] == 0
+
+
+def test_full_queue_is_rejected():
+    llm_scheduler = LLMScheduler(concurrency=1, max_queue=1)
+
+    async def main():
+        release = asyncio.Event()
+
+        async def hold():
+            async with llm_scheduler.slot():
+                await release.wait()
+
+        tasks = [asyncio.create_task(hold()) for _ in range(2)]
+        await asyncio.sleep(0)
+        assert llm_scheduler.is_full()
+
+        with pytest.raises(QueueFull):
+            async with llm_scheduler.slot():
+                pass
+
+        release.set()
+        await asyncio.gather(*tasks)
+
+    asyncio.run(main())
+
+    assert llm_scheduler.stats()["rejected"] == 1
+    assert llm_scheduler.stats()["admitted"] == 2
+
+
+def test_cancelled_waiters_leave_the_queue():
+    llm_scheduler = LLMScheduler(concurrency=1, max_queue=1)
+
+    async def main():
+        release = asyncio.Event()
+
+        async def hold():
+            async with llm_scheduler.slot():
+                await release.wait()
+
+        holder = asyncio.create_task(hold())
+        waiter = asyncio.create_task(hold())
+        await asyncio.sleep(0)
+        waiter.cancel()
+        await asyncio.sleep(0)
+
+        assert llm_scheduler.stats()["queued"] == 0
+        release.set()
+        await holder
+
+    asyncio.run(main())
+
+    assert llm_scheduler.stats()["active"] == 0
+
+
+def test_retry_after_follows_the_service_time(monkeypatch):
+    clock = [0.0]
+    monkeypatch.setattr(scheduler.time, "monotonic", lambda: clock[0])
+    llm_scheduler = LLMScheduler(concurrency=2, max_queue=4)
+
+    assert llm_scheduler.retry_after() == 1
+
+    async def main():
+        # Two requests that held their slot for 10 seconds each
+        for _ in range(2):
+            async with llm_scheduler.slot():
+                clock[0] += 10
+
+    asyncio.run(main())
+
+    # An empty queue waits for one of the two slots: 10 s / 2
+    assert llm_scheduler.retry_after() == 5
+
+
+def test_busy_chat_is_rejected_with_retry_after(main, fake_ollama, monkeypatch):
+    fake_ollama(delay=0.2)
+    monkeypatch.setattr(
+        main, "chat_scheduler", LLMScheduler(concurrency=1, max_queue=1)
+    )
+
+    async def send_all():
+        transport = httpx.ASGITransport(app=main.app)
+        async with httpx.AsyncClient(
+            transport=transport, base_url="http://test"
+        ) as client:
+            return await asyncio.gather(
+                *(
+                    client.post(
+                        "/chat", json=[{"role": "user", "content": f"Question {i}"}]
+                    )
+                    for i in range(3)
+                )
+            )
+
+    responses = asyncio.run(send_all())
+
+    # One request holds the slot, one waits for it and the third one is turned away
+    assert sorted(response.status_code for response in responses) == [200, 200, 503]
+    busy = next(response for response in responses if response.status_code == 503)
+    assert int(busy.headers["retry-after"]) >= 1
+    assert "busy" in busy.json()["error"]
+
+
+def test_busy_chat_stream_is_rejected_before_streaming(
+    client, fake_ollama, main, monkeypatch
+):
+    fake_ollama()
+    llm_scheduler = LLMScheduler(concurrency=1, max_queue=0)
+    llm_scheduler._active = 1  # A request that holds the only slot
+    monkeypatch.setattr(main, "chat_scheduler", llm_scheduler)
+
+    response = client.post(
+        "/chat/stream", json=[{"role": "user", "content": "How many rows?"}]
+    )
+
+    assert response.status_code == 503
+    assert response.headers["retry-after"] == "1"
@@ -0,0 +1,143 @@
+"""
+Checks the vectorized sea water quality index against the original row-wise implementation.
+
+Run from the root of the repository with:
+```bash
+python -m pytest backend/tests
+```
+"""
+
+import numpy as np
+import pandas as pd
+import pytest
+
+from backend.data import DATA_DIR, calculate_sea_water_quality_index
+
+
+def _calculate_sea_water_quality_index(row: pd.Series) -> float:
+    # The original row-wise implementation, kept as the reference
+    weights = {
+        "arsenic": 0.15,
+        "cadmium": 0.15,
+        "copper": 0.1,
+        "dissolved_oxygen_percentage": 0.25,
+        "lead": 0.1,
+        "nickel": 0.1,
+        "temperature": 0.15,
+    }
+
+    threshold_concentration = {
+        "arsenic": 0.012,
+        "cadmium": 0.0055,
+        "copper": 0.0013,
+        "lead": 0.0044,
+        "nickel": 0.07,
+        "dissolved_oxygen_percentage": 100,
+        "temperature": 20,
+    }
+
+    quality_index = 0
+    for parameter, value in row.items():
+        if (
+            parameter not in weights
+            or parameter not in threshold_concentration
+            or pd.isna(value)
+        ):
+            continue
+
+        weight = weights[parameter]
+        threshold = threshold_concentration[parameter]
+
+        if parameter == "temperature":
+            score = max(0, 100 * (1 - abs(value - threshold) / 10))
+        elif parameter == "dissolved_oxygen_percentage":
+            score = min(value, threshold)
+        else:
+            score = max(0, 100 * (1 - value / threshold))
+
+        quality_index += weight * score
+
+    return quality_index
+
+
+def _assert_same_index(df: pd.DataFrame) -> None:
+    expected = df.apply(_calculate_sea_water_quality_index, axis=1).astype(float)
+    pd.testing.assert_series_equal(
+        calculate_sea_water_quality_index(df), expected, check_exact=True
+    )
+
+
+@pytest.fixture
+def sea_water_quality() -> pd.DataFrame:
+    return pd.read_csv(f"{DATA_DIR}/sea_water_quality.tsv", sep="\t").drop(
+        columns=["water_quality_index"]
+    )
+
+
+def test_shipped_data(sea_water_quality: pd.DataFrame):
+    _assert_same_index(sea_water_quality)
+
+
+def test_missing_values(sea_water_quality: pd.DataFrame):
+    rng = np.random.default_rng(0)
+    df = sea_water_quality.copy()
+    for column in ["arsenic", "cadmium", "copper", "lead", "nickel", "temperature"]:
+        df.loc[rng.random(len(df)) < 0.3, column] = np.nan
+    df.loc[0, ["arsenic", "dissolved_oxygen_percentage", "temperature"]] = np.nan
+
+    _assert_same_index(df)
+
+
+def test_all_values_missing():
+    df = pd.DataFrame({"arsenic": [np.nan, np.nan], "temperature": [np.nan, 21.0]})
+
+    _assert_same_index(df)
+
+
+def test_column_order(sea_water_quality: pd.DataFrame):
+    rng = np.random.default_rng(1)
+    for _ in range(5):
+        _assert_same_index(
+            sea_water_quality[rng.permutation(sea_water_quality.columns)]
+        )
+
+
+def test_temperature_and_dissolved_oxygen():
+    df = pd.DataFrame(
+        {
+            # At, around, and more than 10 degrees away from the threshold
+            "temperature": [20.0, 15.0, 25.0, 9.0, 31.5, 10.0, 30.0],
+            # Below, at and above the threshold
+            "dissolved_oxygen_percentage": [
+                0.0,
+                55.5,
+                100.0,
+                120.0,
+                99.9,
+                100.1,
+                250.0,
+            ],
+        }
+    )
+
+    _assert_same_index(df)
+
+
+def test_random_rows():
+    rng = np.random.default_rng(2)
+    rows = 2_000
+    df = pd.DataFrame(
+        {
+            "arsenic": rng.uniform(0, 0.03, rows),
+            "cadmium": rng.uniform(0, 0.01, rows),
+            "copper": rng.uniform(0, 0.003, rows),
+            "dissolved_oxygen_percentage": rng.uniform(50, 150, rows),
+            "lead": rng.uniform(0, 0.01, rows),
+            "nickel": rng.uniform(0, 0.1, rows),
+            "temperature": rng.uniform(0, 40, rows),
+            "dissolved_oxygen": rng.uniform(5, 12, rows),
+        }
+    )
+    df = df.mask(rng.random(df.shape) < 0.2)
+
+    _assert_same_index(df)
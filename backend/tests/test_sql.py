@@ -0,0 +1,70 @@
+"""
+Checks the guardrails of the SQL engine the chat tools run their queries on.
+"""
+
+import sqlite3
+
+import pandas as pd
+import pytest
+
+from backend.sql import QueryError, SQLEngine, write_database
+
+
+@pytest.fixture
+def tables() -> dict[str, pd.DataFrame]:
+    return {
+        "air_quality": pd.DataFrame({"location": ["a", "b"] * 50, "co": range(100)}),
+        "sea_water_quality": pd.DataFrame({"location": ["c"], "lead": [0.1]}),
+    }
+
+
+@pytest.fixture(params=["memory", "file"])
+def engine(request, tables: dict[str, pd.DataFrame], tmp_path) -> SQLEngine:
+    if request.param == "memory":
+        return SQLEngine(tables)
+
+    path = str(tmp_path / "tables.sqlite3")
+    write_database(tables, path)
+    return SQLEngine(tables, path)
+
+
+def test_tables_are_scoped(engine: SQLEngine):
+    query = "SELECT * FROM sea_water_quality"
+
+    # Run without a scope first, so the statement is cached before it's denied
+    assert len(engine.query(query, 5, 10)[0]) == 1
+    with pytest.raises(QueryError, match="air_quality"):
+        engine.query(query, 5, 10, tables=["air_quality"])
+    with pytest.raises(QueryError):
+        engine.query(
+            "WITH x AS (SELECT * FROM sea_water_quality) SELECT * FROM x",
+            5,
+            10,
+            tables=["air_quality"],
+        )
+    assert len(engine.query(query, 5, 10, tables=["sea_water_quality"])[0]) == 1
+
+
+def test_rows_are_capped(engine: SQLEngine):
+    df, truncated = engine.query("SELECT * FROM air_quality a, air_quality b", 5, 10)
+    assert len(df) == 10 and truncated
+
+    df, truncated = engine.query("SELECT * FROM air_quality LIMIT 10", 5, 10)
+    assert len(df) == 10 and not truncated
+
+
+def test_only_select_queries(engine: SQLEngine):
+    with pytest.raises(QueryError):
+        engine.query("DELETE FROM air_quality", 5, 10)
+
+
+def test_database_file_is_read_only(tables: dict[str, pd.DataFrame], tmp_path):
+    path = str(tmp_path / "tables.sqlite3")
+    write_database(tables, path)
+    engine = SQLEngine(tables, path)
+
+    with pytest.raises(sqlite3.OperationalError):
+        engine.connection().execute("DELETE FROM air_quality")
+    assert (
+        engine.query("SELECT count(*) AS n FROM air_quality", 5, 10)[0]["n"][0] == 100
+    )
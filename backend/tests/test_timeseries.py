@@ -0,0 +1,131 @@
+"""
+Checks the multi resolution time series store behind the `/timeseries` endpoint.
+"""
+
+from datetime import date
+
+import numpy as np
+import pandas as pd
+import pytest
+
+from backend.timeseries import TimeSeriesStore, lttb, means_rollup
+
+
+@pytest.fixture
+def store() -> TimeSeriesStore:
+    # Daily values (the day of the year) and monthly means that disagree with them on purpose
+    days = pd.date_range("2023-01-01", "2023-12-31", freq="D")
+    daily = pd.DataFrame(
+        {
+            "location": "a",
+            "date": days.strftime("%Y-%m-%d"),
+            "co": np.arange(1, len(days) + 1, dtype=float),
+        }
+    )
+    monthly = pd.DataFrame(
+        {
+            "location": "a",
+            "date": [f"2023-{month:02}" for month in range(1, 13)],
+            "co": 1000.0,
+            "no2": np.arange(12, dtype=float),
+        }
+    )
+
+    return TimeSeriesStore(
+        [
+            ("month", means_rollup(monthly, ["co", "no2"], "month")),
+            ("day", means_rollup(daily, ["co"], "day")),
+        ]
+    )
+
+
+def test_lttb_keeps_short_lines():
+    x = np.arange(5, dtype=float)
+
+    assert lttb(x, x, 5).tolist() == [0, 1, 2, 3, 4]
+    assert lttb(x, x, 10).tolist() == [0, 1, 2, 3, 4]
+
+
+def test_lttb_keeps_the_ends_and_the_peaks():
+    x = np.arange(100, dtype=float)
+    y = np.zeros(100)
+    y[37], y[71] = 10.0, -10.0
+
+    indices = lttb(x, y, 10)
+
+    assert len(indices) == 10
+    assert indices[0] == 0 and indices[-1] == 99
+    assert (np.diff(indices) > 0).all()
+    assert 37 in indices and 71 in indices
+
+
+def test_means_rollup():
+    df = pd.DataFrame(
+        {"location": ["a", "a"], "date": ["2023-01", "2023-02"], "co": [2.0, np.nan]}
+    )
+
+    rollup = means_rollup(df, ["co"], "month")
+
+    assert rollup["period"].astype(str).tolist() == ["2023-01", "2023-02"]
+    assert rollup["co_sum"].tolist() == [2.0, 0.0]
+    assert rollup["co_count"].tolist() == [1, 0]
+    assert rollup["co_min"].iloc[0] == rollup["co_max"].iloc[0] == 2.0
+    assert np.isnan(rollup["co_min"].iloc[1])
+
+
+def test_rollups_come_from_the_finest_base(store: TimeSeriesStore):
+    series = store.series("a", "co", None, None, "quarter", 100)
+
+    first = series["points"][0]
+    assert first["period"] == "2023-Q1"
+    assert (first["min"], first["max"], first["count"]) == (1.0, 90.0, 90)
+    # Metrics that only the monthly base has are rolled up from it
+    assert store.series("a", "no2", None, None, "year", 100)["points"][0]["count"] == 12
+
+
+def test_period_labels(store: TimeSeriesStore):
+    labels = {
+        resolution: store.series(
+            "a", "co", date(2023, 1, 2), date(2023, 1, 2), resolution, 100
+        )["points"]
+        for resolution in ["day", "week"]
+    }
+
+    assert [point["period"] for point in labels["day"]] == ["2023-01-02"]
+    assert [point["period"] for point in labels["week"]] == ["2023-W01"]
+
+
+def test_range_is_inclusive(store: TimeSeriesStore):
+    series = store.series("a", "co", date(2023, 2, 1), date(2023, 4, 1), "month", 100)
+
+    assert [point["period"] for point in series["points"]] == [
+        "2023-02",
+        "2023-03",
+        "2023-04",
+    ]
+    assert series["points"][0]["start"] == date(2023, 2, 1)
+
+
+def test_resolution_is_picked_automatically(store: TimeSeriesStore):
+    # 365 days and 53 weeks don't fit in 20 points, 12 months do
+    assert store.series("a", "co", None, None, None, 20)["resolution"] == "month"
+    assert store.series("a", "co", None, None, None, 400)["resolution"] == "day"
+    # Without a fitting resolution the coarsest one is used
+    assert store.series("a", "co", None, None, None, 0)["resolution"] == "year"
+    # Only the monthly base has the metric, so there is no finer resolution
+    assert store.series("a", "no2", None, None, "day", 100)["resolution"] == "month"
+
+
+def test_long_series_are_downsampled(store: TimeSeriesStore):
+    series = store.series("a", "co", None, None, "day", 50)
+
+    assert series["downsampled"]
+    assert len(series["points"]) == 50
+    assert series["points"][0]["start"] == date(2023, 1, 1)
+    assert series["points"][-1]["start"] == date(2023, 12, 31)
+    assert not store.series("a", "co", None, None, "month", 50)["downsampled"]
+
+
+def test_missing_series(store: TimeSeriesStore):
+    assert store.series("b", "co", None, None, None, 100) is None
+    assert store.series("a", "so2", None, None, None, 100) is None
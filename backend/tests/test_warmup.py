@@ -0,0 +1,77 @@
+"""
+Checks the warmer that keeps the chat model loaded, against a fake Ollama client.
+"""
+
+import asyncio
+
+from conftest import FakeOllamaClient
+
+from backend.warmup import ModelWarmer
+
+
+def _warmer(client: FakeOllamaClient, prompts: list[str] | None = None) -> ModelWarmer:
+    prompts = iter(prompts or ["The system prompt."] * 100)
+    return ModelWarmer(
+        client,
+        "model",
+        lambda: next(prompts),
+        tools=["tool"],
+        options={"temperature": 0},
+        keep_alive="30m",
+        interval=0.01,
+    )
+
+
+def test_warm_up_primes_the_system_prompt():
+    client = FakeOllamaClient()
+    warmer = _warmer(client)
+
+    asyncio.run(warmer.warm_up())
+
+    (request,) = client.requests
+    assert request["messages"] == [{"role": "system", "content": "The system prompt."}]
+    assert request["tools"] == ["tool"]
+    # A single token is generated, with the options of the real requests so the prompt cache matches
+    assert request["options"] == {"temperature": 0, "num_predict": 1}
+    assert request["keep_alive"] == "30m"
+    assert warmer.status() == {
+        "model": "model",
+        "ready": True,
+        "last_ping": warmer.last_ping,
+        "last_error": None,
+    }
+    assert warmer.last_ping is not None
+
+
+def test_failed_warm_up_is_reported():
+    client = FakeOllamaClient(error=ConnectionError("Ollama is down"))
+    warmer = _warmer(client)
+
+    asyncio.run(warmer.warm_up())
+
+    assert not warmer.ready
+    assert warmer.last_error == "Ollama is down"
+
+    # It's ready again as soon as a warm-up succeeds
+    client.error = None
+    asyncio.run(warmer.warm_up())
+
+    assert warmer.ready and warmer.last_error is None
+
+
+def test_run_keeps_the_model_alive():
+    client = FakeOllamaClient()
+    warmer = _warmer(client, [f"Prompt {i}" for i in range(100)])
+
+    async def run_for_a_while():
+        task = asyncio.create_task(warmer.run())
+        await asyncio.sleep(0.1)
+        task.cancel()
+
+    asyncio.run(run_for_a_while())
+
+    assert len(client.requests) >= 2
+    # Every warm-up primes the current system prompt
+    prompts = [request["messages"][0]["content"] for request in client.requests]
+    assert prompts[:2] == ["Prompt 0", "Prompt 1"]
+    assert all(request["keep_alive"] == "30m" for request in client.requests)
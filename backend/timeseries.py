@@ -0,0 +1,309 @@
+"""
+This module holds the multi resolution time series store behind the `/timeseries` endpoint.
+
+For every metric, location and resolution (day, week, month, quarter, year) the store keeps a precomputed rollup
+with the sum, the count, the minimum and the maximum of the values of every period, so a series is just a slice
+of a few arrays, whatever the range. Each rollup is built from the finest base table that has the metric
+(and is not coarser than it), so its minimums, maximums and counts are those of the finest values there are:
+the daily rollups of the preprocessing (when the original data were preprocessed),
+the monthly air quality means and the yearly sea water quality values.
+The periods are labeled like everywhere else in the API (see `helpers.period_label`).
+
+The store only changes with the data, so it's built once per generation of the columnar copy of the data
+and kept next to it, every other process loads it from there instead of rolling up the bases again.
+
+Long series are cut down to a number of points with the Largest-Triangle-Three-Buckets (LTTB) algorithm,
+which keeps the visual shape of the line (peaks included) much better than taking every n-th point.
+"""
+
+from datetime import date
+import pickle
+
+import numpy as np
+import pandas as pd
+
+from .data import ROLLUP_STATISTICS, generation_file, on_load
+from . import helpers
+
+# The pandas period frequencies of the resolutions, from the finest to the coarsest
+RESOLUTIONS = {"day": "D", "week": "W", "month": "M", "quarter": "Q", "year": "Y"}
+# Bump it when the store changes, so the stores kept with the existing columnar copies are not used
+STORE_FILE = "timeseries-1.pickle"
+
+
+def means_rollup(df: pd.DataFrame, metrics: list[str], resolution: str) -> pd.DataFrame:
+    """
+    Turn a table with a single (mean) value per location and period into a base rollup,
+    every value counts as one value of its period.
+
+    Args:
+        df (pd.DataFrame): The table, with `location` and `date` columns and the metric columns.
+        metrics (list[str]): The metric columns of the table.
+        resolution (str): The resolution of the values of the table.
+
+    Returns:
+        pd.DataFrame: The rollup, with `location`, `period` and `<metric>_<statistic>` columns.
+    """
+
+    rollup = {
+        "location": df["location"].to_numpy(),
+        "period": pd.PeriodIndex(df["date"], freq=RESOLUTIONS[resolution]),
+    }
+    for metric in metrics:
+        values = df[metric].to_numpy(dtype=float)
+        rollup[f"{metric}_sum"] = np.nan_to_num(values)
+        rollup[f"{metric}_count"] = (~np.isnan(values)).astype(int)
+        rollup[f"{metric}_min"] = values
+        rollup[f"{metric}_max"] = values
+
+    return pd.DataFrame(rollup)
+
+
+def lttb(x: np.ndarray, y: np.ndarray, threshold: int) -> np.ndarray:
+    """
+    Pick the points of a line that keep its shape, with the Largest-Triangle-Three-Buckets algorithm.
+    The first and the last points are always kept, every bucket in between keeps the point that forms
+    the largest triangle with the point kept from the previous bucket and the average of the next bucket.
+
+    Args:
+        x (np.ndarray): The (increasing) x values of the points.
+        y (np.ndarray): The y values of the points.
+        threshold (int): The number of points to keep.
+
+    Returns:
+        np.ndarray: The indices of the kept points, in order.
+    """
+
+    n = len(x)
+    if threshold >= n or threshold < 3:
+        return np.arange(n)
+
+    # The first and the last buckets only hold the first and the last point
+    edges = np.floor(np.linspace(1, n - 1, threshold - 1)).astype(int)
+    indices = np.empty(threshold, dtype=int)
+    indices[0], indices[-1] = 0, n - 1
+
+    selected = 0
+    for bucket in range(threshold - 2):
+        start, stop = edges[bucket], edges[bucket + 1]
+        next_start, next_stop = stop, (
+            edges[bucket + 2] if bucket + 2 < len(edges) else n
+        )
+        average_x = x[next_start:next_stop].mean()
+        average_y = y[next_start:next_stop].mean()
+
+        areas = np.abs(
+            (x[selected] - average_x) * (y[start:stop] - y[selected])
+            - (x[selected] - x[start:stop]) * (average_y - y[selected])
+        )
+        selected = start + int(np.argmax(areas))
+        indices[bucket + 1] = selected
+
+    return indices
+
+
+class TimeSeriesStore:
+    """
+    Precomputed rollups of some base tables at every resolution, per metric and location.
+
+    Attributes:
+        metrics (list[str]): The metrics of the store.
+    """
+
+    def __init__(self, bases: list[tuple[str, pd.DataFrame]]):
+        """
+        Args:
+            bases (list[tuple[str, pd.DataFrame]]): The resolution and the rollup of every base table,
+                like the ones `means_rollup` returns.
+        """
+
+        self._series: dict[str, dict[str, dict[str, dict[str, np.ndarray]]]] = {}
+        metrics = {
+            column.rsplit("_", 1)[0]
+            for _, base in bases
+            for column in base.columns
+            if column not in ("location", "period")
+        }
+
+        for resolution, freq in RESOLUTIONS.items():
+            for metric in metrics:
+                # Roll up the finest base that has the metric, and is not coarser than the resolution
+                candidates = [
+                    (_order(base_resolution), base)
+                    for base_resolution, base in bases
+                    if _order(base_resolution) <= _order(resolution)
+                    and f"{metric}_sum" in base.columns
+                ]
+                if candidates:
+                    _, base = min(candidates, key=lambda candidate: candidate[0])
+                    self._add(metric, resolution, freq, base)
+
+        self.metrics = sorted(self._series)
+
+    def _add(self, metric: str, resolution: str, freq: str, base: pd.DataFrame) -> None:
+        columns = [f"{metric}_{statistic}" for statistic in ROLLUP_STATISTICS]
+        rollup = (
+            base[columns]
+            .groupby([base["location"], base["period"].dt.asfreq(freq)])
+            .agg(dict(zip(columns, ["sum", "sum", "min", "max"])))
+        )
+        rollup = rollup[rollup[f"{metric}_count"] > 0]
+
+        for location, series in rollup.groupby(level=0):
+            starts = series.index.get_level_values(1).start_time
+            self._series.setdefault(metric, {}).setdefault(resolution, {})[location] = {
+                "periods": np.array(
+                    [helpers.period_label(start, resolution) for start in starts.date]
+                ),
+                "starts": starts.to_numpy().astype("datetime64[D]"),
+                **{
+                    statistic: series[column].to_numpy()
+                    for statistic, column in zip(ROLLUP_STATISTICS, columns)
+                },
+            }
+
+    def series(
+        self,
+        location: str,
+        metric: str,
+        from_date: date | None,
+        to_date: date | None,
+        resolution: str | None,
+        max_points: int,
+    ) -> dict | None:
+        """
+        Get the series of a metric at a location, with the periods that start inside the (inclusive) date range.
+
+        With a resolution, the coarsest rollup that is not coarser than it is used (or the finest one,
+        if they are all coarser). Without one, the finest rollup whose periods in the range fit in `max_points`
+        is used (or the coarsest one, if none fits). Either way, a series with more than `max_points` points
+        is downsampled with LTTB.
+
+        Args:
+            location (str): The location of the series.
+            metric (str): The metric of the series.
+            from_date (date | None): The start of the range, None means from the first period.
+            to_date (date | None): The end of the range, None means until the last period.
+            resolution (str | None): The requested resolution, None picks one automatically.
+            max_points (int): The maximum number of points of the series.
+
+        Returns:
+            dict | None: The location, the metric, the used resolution, whether it was downsampled and the points
+                (period, start, mean, min, max and count), or None if there is no data for the metric and location.
+        """
+
+        rollups = self._series.get(metric, {})
+        available = [r for r in RESOLUTIONS if location in rollups.get(r, {})]
+        if not available:
+            return None
+
+        def window(resolution: str) -> tuple[dict[str, np.ndarray], int, int]:
+            series = rollups[resolution][location]
+            starts = series["starts"]
+            start = (
+                0
+                if from_date is None
+                else np.searchsorted(starts, np.datetime64(from_date, "D"))
+            )
+            stop = (
+                len(starts)
+                if to_date is None
+                else np.searchsorted(starts, np.datetime64(to_date, "D"), side="right")
+            )
+            return series, int(start), max(int(start), int(stop))
+
+        def size(resolution: str) -> int:
+            _, start, stop = window(resolution)
+            return stop - start
+
+        if resolution is not None:
+            finer = [r for r in available if _order(r) <= _order(resolution)]
+            resolution = finer[-1] if finer else available[0]
+        else:
+            resolution = next(
+                (r for r in available if size(r) <= max_points), available[-1]
+            )
+
+        series, start, stop = window(resolution)
+        means = series["sum"][start:stop] / series["count"][start:stop]
+        starts = series["starts"][start:stop]
+        indices = lttb(starts.astype(float), means, max_points)
+
+        return {
+            "location": location,
+            "metric": metric,
+            "resolution": resolution,
+            "downsampled": len(indices) < stop - start,
+            "points": [
+                {
+                    "period": period,
+                    "start": period_start,
+                    "mean": mean,
+                    "min": minimum,
+                    "max": maximum,
+                    "count": count,
+                }
+                for period, period_start, mean, minimum, maximum, count in zip(
+                    series["periods"][start:stop][indices].tolist(),
+                    starts[indices].tolist(),
+                    means[indices].tolist(),
+                    series["min"][start:stop][indices].tolist(),
+                    series["max"][start:stop][indices].tolist(),
+                    series["count"][start:stop][indices].tolist(),
+                )
+            ],
+        }
+
+
+def _order(resolution: str) -> int:
+    return list(RESOLUTIONS).index(resolution)
+
+
+def _build(data: dict) -> TimeSeriesStore:
+    air_quality_metrics = [
+        col for col in helpers.AIR_QUALITY_COLUMNS if col in data["air_quality"].columns
+    ]
+    sea_water_quality_metrics = [
+        col
+        for col in helpers.SEA_WATER_QUALITY_COLUMNS
+        if col in data["sea_water_quality"].columns
+    ]
+
+    # The sea water data are yearly, their monthly rows are copies of the yearly ones
+    sea_water_quality = data["sea_water_quality"].drop_duplicates(["location", "year"])
+
+    bases = [
+        ("month", means_rollup(data["air_quality"], air_quality_metrics, "month")),
+        (
+            "year",
+            means_rollup(sea_water_quality, sea_water_quality_metrics, "year"),
+        ),
+    ]
+    if data["air_quality_daily"] is not None:
+        daily = data["air_quality_daily"]
+        bases.append(
+            (
+                "day",
+                daily.drop(columns="date").assign(
+                    period=pd.PeriodIndex(daily["date"], freq="D")
+                ),
+            )
+        )
+
+    return TimeSeriesStore(bases)
+
+
+def _save(store: TimeSeriesStore, path: str) -> None:
+    with open(path, "wb") as f:
+        pickle.dump(store, f, protocol=pickle.HIGHEST_PROTOCOL)
+
+
+@on_load
+def _rebuild(data: dict) -> None:
+    path = generation_file(data, STORE_FILE, lambda path: _save(_build(data), path))
+    if path is None:
+        data["timeseries"] = _build(data)
+        return
+
+    with open(path, "rb") as f:
+        data["timeseries"] = pickle.load(f)
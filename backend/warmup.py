@@ -0,0 +1,96 @@
+"""
+This module keeps the chat model loaded and its system prompt processed, so the first `/chat` after a deploy
+or an idle period doesn't pay for loading the model and processing the (long) system prompt.
+
+The warmer sends a tiny chat request with just the system prompt and the tools (the same prefix every real
+request starts with) right after startup and then periodically, with a `keep_alive` that keeps the model
+resident in between. Its status is reported by the health endpoint.
+"""
+
+from typing import Any, Callable, Iterable
+import asyncio
+import time
+
+import ollama
+
+
+class ModelWarmer:
+    """
+    Preloads a model on the Ollama server, primes the system prompt and keeps the model resident.
+    The system prompt is given as a function, so every warm-up primes the prompt of the current data.
+
+    Attributes:
+        ready (bool): Whether the last warm-up request succeeded.
+        last_ping (float | None): The time (`time.time()`) of the last successful warm-up request.
+        last_error (str | None): The error of the last failed warm-up request, if the last one failed.
+    """
+
+    def __init__(
+        self,
+        client: ollama.AsyncClient,
+        model: str,
+        system_prompt: Callable[[], str],
+        tools: Iterable[Any],
+        options: dict,
+        keep_alive: str,
+        interval: float,
+    ):
+        self.ready = False
+        self.last_ping: float | None = None
+        self.last_error: str | None = None
+        self._client = client
+        self._model = model
+        self._system_prompt = system_prompt
+        self._tools = tools
+        self._options = options
+        self._keep_alive = keep_alive
+        self._interval = interval
+
+    async def warm_up(self) -> None:
+        """
+        Send a single warm-up request, it loads the model (if needed) and processes the system prompt.
+        """
+
+        try:
+            await self._client.chat(
+                self._model,
+                messages=[{"role": "system", "content": self._system_prompt()}],
+                tools=self._tools,
+                # Generating a single token is enough to process (and cache) the prompt
+                options={**self._options, "num_predict": 1},
+                keep_alive=self._keep_alive,
+            )
+        except Exception as e:
+            if self.ready or self.last_error is None:
+                print("Model warm-up failed:", e)
+
+            self.ready = False
+            self.last_error = str(e)
+        else:
+            self.ready = True
+            self.last_ping = time.time()
+            self.last_error = None
+
+    async def run(self) -> None:
+        """
+        Warm the model up now and then every `interval` seconds, until the task is cancelled.
+        """
+
+        while True:
+            await self.warm_up()
+            await asyncio.sleep(self._interval)
+
+    def status(self) -> dict[str, Any]:
+        """
+        Get the readiness of the model.
+
+        Returns:
+            dict[str, Any]: The model name, whether it's ready, and the time and error of the last request.
+        """
+
+        return {
+            "model": self._model,
+            "ready": self.ready,
+            "last_ping": self.last_ping,
+            "last_error": self.last_error,
+        }
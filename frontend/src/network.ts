@@ -5,7 +5,7 @@ import { Location, Report, MessageList } from "./types";
 const API_URL = `${import.meta.env.VITE_API_HOST}/api`;
 
 export async function getLocations(): Promise<Location[]> {
-  const response = await fetch(`${API_URL}/locations`);
+  const response = await fetch(`${API_URL}/locations?detail=medium`);
   return response.json();
 }
 